@@ -1,14 +1,81 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Annotated
+import asyncio
 import httpx
+import itertools
+import json
+import math
 import os
+import secrets
+import signal
+import time
 
-from ml_engine import recommender
+from cache import MISSING, SingleFlight, SqliteCache, TTLCache
+from inference import InferenceExecutor
+from feedback import append_feedback
+from generate_data import WEATHER_CODES
+from recommend_cache import RecommendCache
+from resilience import CircuitBreaker, Deadline, LatencyTracker, backoff, hedged
+from ml_engine import FEEDBACK_LOG, UnifiedRecommender, recommender
+import metrics
+from metrics import MODEL_LOAD_SECONDS, MODEL_TRAIN_SECONDS, REQUESTS, REQUEST_SECONDS, UPSTREAM_ERRORS, timed
 
-app = FastAPI(title="WeatherBot Web API + ML")
+TIMING_HEADER = os.environ.get("WEATHER_TIMING_HEADER", "0") == "1"
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content):
+        with timed("serialization"):
+            return super().render(content)
+
+class MetricsMiddleware:
+    """Per-endpoint request counters and latency; with WEATHER_TIMING_HEADER=1 every response also
+    gets a Server-Timing header with the stages (geocode, forecast, inference, ...) of that request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        timings = [] if TIMING_HEADER else None
+        token = metrics.request_timings.set(timings)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    header = metrics.server_timing(timings, time.perf_counter() - start)
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.request_timings.reset(token)
+            # route templates, not raw paths, keep the label set bounded
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            REQUESTS.labels(endpoint, scope["method"], status).inc()
+            REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+
+app = FastAPI(title="WeatherBot Web API + ML", default_response_class=TimedJSONResponse)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request, exc):
+    """FastAPI's 422 echoes the rejected input, which fails to serialize for Infinity or NaN."""
+    errors = [{k: v for k, v in e.items() if not (k == "input" and isinstance(v, float) and not math.isfinite(v))}
+              for e in exc.errors()]
+    return JSONResponse({"detail": jsonable_encoder(errors)}, status_code=422)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,41 +92,317 @@ if not os.path.exists(FRONTEND_DIR):
 if os.path.exists(FRONTEND_DIR):
     app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
 
+OPEN_METEO_GEOCODE_URL = os.environ.get("OPEN_METEO_GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
+OPEN_METEO_FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+HTTP_TIMEOUT = float(os.environ.get("WEATHER_HTTP_TIMEOUT", "5.0"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("WEATHER_HTTP_CONNECT_TIMEOUT", "3.0"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("WEATHER_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("WEATHER_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("WEATHER_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2 = os.environ.get("WEATHER_HTTP2", "1") == "1"
+
+# time budget per stage (all attempts of one geocode / forecast call), each attempt is also capped at HTTP_TIMEOUT
+GEOCODE_DEADLINE = float(os.environ.get("WEATHER_GEOCODE_DEADLINE", "4.0"))
+FORECAST_DEADLINE = float(os.environ.get("WEATHER_FORECAST_DEADLINE", "8.0"))
+UPSTREAM_RETRIES = int(os.environ.get("WEATHER_UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF = float(os.environ.get("WEATHER_UPSTREAM_BACKOFF", "0.1"))
+UPSTREAM_BACKOFF_CAP = float(os.environ.get("WEATHER_UPSTREAM_BACKOFF_CAP", "1.0"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# hedging: a second identical request once the first is slower than the recent p95
+UPSTREAM_HEDGE = os.environ.get("WEATHER_UPSTREAM_HEDGE", "0") == "1"
+HEDGE_QUANTILE = float(os.environ.get("WEATHER_HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.environ.get("WEATHER_HEDGE_MIN_DELAY", "0.05"))
+BREAKER_FAILURES = int(os.environ.get("WEATHER_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.environ.get("WEATHER_BREAKER_RESET", "30"))
+
+GEOCODE_CACHE_SIZE = int(os.environ.get("WEATHER_GEOCODE_CACHE_SIZE", "4096"))
+GEOCODE_TTL = float(os.environ.get("WEATHER_GEOCODE_TTL", str(7 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = float(os.environ.get("WEATHER_GEOCODE_NEGATIVE_TTL", "600"))
+GEOCODE_CACHE_DB = os.environ.get("WEATHER_GEOCODE_CACHE_DB", "")
+
+FORECAST_MAX_DAYS = 16
+FORECAST_CACHE_SIZE = int(os.environ.get("WEATHER_FORECAST_CACHE_SIZE", "4096"))
+FORECAST_COORD_DECIMALS = int(os.environ.get("WEATHER_FORECAST_COORD_DECIMALS", "2"))
+FORECAST_FETCH_DAYS = int(os.environ.get("WEATHER_FORECAST_FETCH_DAYS", str(FORECAST_MAX_DAYS)))
+FORECAST_UPDATE_INTERVAL = float(os.environ.get("WEATHER_FORECAST_UPDATE_INTERVAL", "3600"))
+FORECAST_UPDATE_OFFSET = float(os.environ.get("WEATHER_FORECAST_UPDATE_OFFSET", "300"))
+FORECAST_STALE_TTL = float(os.environ.get("WEATHER_FORECAST_STALE_TTL", "3600"))
+# older forecasts are kept this long beyond the stale window, served only when the upstream fails
+FORECAST_OFFLINE_TTL = float(os.environ.get("WEATHER_FORECAST_OFFLINE_TTL", str(24 * 3600)))
+SINGLE_FLIGHT = os.environ.get("WEATHER_SINGLE_FLIGHT", "1") == "1"
+
+INFERENCE_EXECUTOR = os.environ.get("WEATHER_INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("WEATHER_INFERENCE_WORKERS", "2"))
+INFERENCE_BATCH_WINDOW_MS = float(os.environ.get("WEATHER_INFERENCE_BATCH_WINDOW_MS", "2"))
+INFERENCE_MAX_BATCH = int(os.environ.get("WEATHER_INFERENCE_MAX_BATCH", "512"))
+
+BULK_CONCURRENCY = int(os.environ.get("WEATHER_BULK_CONCURRENCY", "8"))
+BULK_CHUNK = int(os.environ.get("WEATHER_BULK_CHUNK", "50"))
+BULK_MAX_LOCATIONS = int(os.environ.get("WEATHER_BULK_MAX_LOCATIONS", "5000"))
+RECOMMEND_CACHE_SIZE = int(os.environ.get("WEATHER_RECOMMEND_CACHE_SIZE", "65536"))  # 0 disables it
+# ";"-separated hobby lists (as sent in "hobbies") precomputed for every weather code on the grid below
+RECOMMEND_WARM_HOBBIES = [h for h in os.environ.get("WEATHER_RECOMMEND_WARM_HOBBIES", "").split(";") if h.strip()]
+RECOMMEND_WARM_TEMPERATURES = range(-30, 41)
+RECOMMEND_WARM_WINDS = range(0, 21)
+RECOMMEND_WARM_CHUNK = 2048
+
+# set by serve.py in its workers: model reloads go through the supervisor
+SUPERVISOR_PID = int(os.environ.get("WEATHER_SUPERVISOR_PID", "0"))
+# /api/feedback and /api/model/reload need it in X-Admin-Token; unset, both are disabled
+ADMIN_TOKEN = os.environ.get("WEATHER_ADMIN_TOKEN", "")
+
+http_client = None
+background_tasks = set()
+geocode_cache = TTLCache(GEOCODE_CACHE_SIZE, GEOCODE_TTL)
+# opened on startup, so serve.py's forked workers each get their own connection
+geocode_db = None
+geocode_flight = SingleFlight(SINGLE_FLIGHT)
+# value: (days, data, fresh_until); entries stay servable as stale for FORECAST_STALE_TTL after that,
+# and as an offline fallback for FORECAST_OFFLINE_TTL more
+forecast_cache = TTLCache(FORECAST_CACHE_SIZE, FORECAST_UPDATE_INTERVAL + FORECAST_STALE_TTL + FORECAST_OFFLINE_TTL)
+forecast_flight = SingleFlight(SINGLE_FLIGHT)
+forecast_stats = {"stale_served": 0, "refreshes": 0, "refresh_errors": 0, "offline_served": 0}
+upstream_deadlines = {"geocode": GEOCODE_DEADLINE, "forecast": FORECAST_DEADLINE}
+upstream_unavailable = {"geocode": "Geocoding API unavailable", "forecast": "Weather API unavailable"}
+upstream_breakers = {api: CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET) for api in upstream_deadlines}
+upstream_latency = {api: LatencyTracker() for api in upstream_deadlines}
+upstream_stats = {api: {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+                  for api in upstream_deadlines}
+recommend_cache = RecommendCache(RECOMMEND_CACHE_SIZE)
+inference = InferenceExecutor(
+    recommender, INFERENCE_EXECUTOR, workers=INFERENCE_WORKERS,
+    batch_window=INFERENCE_BATCH_WINDOW_MS / 1000, max_batch=INFERENCE_MAX_BATCH,
+)
+recommender.on_stage = metrics.observe_stage
+
+def create_http_client():
+    http2 = HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("⚠️ [HTTP] h2 is not installed, falling back to HTTP/1.1 keep-alive")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+def get_http_client():
+    """Application-lifetime client: upstream connections are pooled and reused across requests."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = create_http_client()
+    return http_client
+
 @app.on_event("startup")
 async def startup_event():
-    recommender.load_and_train()
+    global geocode_db
+    get_http_client()
+    if GEOCODE_CACHE_DB and geocode_db is None:
+        geocode_db = SqliteCache(GEOCODE_CACHE_DB)
+    # under serve.py the models were loaded before the fork (and the gauges set there)
+    if not recommender.is_trained:
+        start = time.perf_counter()
+        recommender.load_and_train()
+        MODEL_LOAD_SECONDS.labels(recommender.engine).set(time.perf_counter() - start)
+        MODEL_TRAIN_SECONDS.labels(recommender.engine).set(recommender.train_seconds)
+    inference.start()
+    reset_recommend_cache(recommender)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    global http_client, geocode_db
+    for task in list(background_tasks):
+        task.cancel()
+    geocode_flight.cancel_all()
+    forecast_flight.cancel_all()
+    inference.shutdown()
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    if geocode_db is not None:
+        await asyncio.to_thread(geocode_db.purge_expired)
+        geocode_db.close()
+        geocode_db = None
+
+# NaN or Infinity would get made-up advice (or fail the whole micro-batch it lands in)
+FiniteFloat = Annotated[float, Field(allow_inf_nan=False)]
 
 class WeatherRequest(BaseModel):
-    temperature: float
-    wind_speed: float
+    temperature: FiniteFloat
+    wind_speed: FiniteFloat
     weather_code: int
     hobbies: str = ""
 
-@app.post("/api/recommend")
-async def recommend_clothing(data: WeatherRequest):
-    clothes_advice = recommender.predict_clothing(
-        data.temperature, data.wind_speed, data.weather_code
-    )
-    
-    hobby_advice_list = []
-    if data.hobbies:
-        user_hobbies = [h.strip() for h in data.hobbies.split(',')]
-        
-        for hobby in user_hobbies:
-            advice = recommender.predict_hobby(
-                data.temperature, data.wind_speed, data.weather_code, hobby
-            )
-            if advice:
-                hobby_advice_list.append(f"🎯 <b>{hobby.capitalize()}:</b> {advice}")
+def split_hobbies(hobbies: str):
+    return [h.strip() for h in hobbies.split(',')] if hobbies else []
+
+def format_recommendation(clothes_advice, hobby_advices):
+    hobby_advice_list = [
+        f"🎯 <b>{hobby.capitalize()}:</b> {advice}" for hobby, advice in hobby_advices if advice
+    ]
 
     full_advice = clothes_advice
     if hobby_advice_list:
         full_advice += "\n\n" + "\n".join(hobby_advice_list)
+    return full_advice
 
-    return {"recommendation": full_advice}
+@app.post("/api/recommend")
+async def recommend_clothing(data: WeatherRequest):
+    hobbies = split_hobbies(data.hobbies)
+    if not recommend_cache.enabled:
+        clothes_advice, hobby_advices = await inference.predict(
+            data.temperature, data.wind_speed, data.weather_code, hobbies
+        )
+        return {"recommendation": format_recommendation(clothes_advice, hobby_advices)}
+
+    start = time.perf_counter()
+    model = recommend_cache.recommender
+    key, resolved = recommend_cache.key(data.temperature, data.wind_speed, data.weather_code, hobbies)
+    answer = recommend_cache.get(key) if key is not None else MISSING
+    stage = "recommend_cache_hit"
+    if answer is MISSING:
+        stage = "recommend_cache_miss"
+        # resolved names resolve to themselves, so the advice comes back keyed by them
+        clothes_advice, hobby_advices = await inference.predict(
+            data.temperature, data.wind_speed, data.weather_code, sorted(set(resolved))
+        )
+        answer = (clothes_advice, dict(hobby_advices))
+        if key is not None:
+            recommend_cache.set(key, answer, model)
+    clothes_advice, advice_of = answer
+    response = {"recommendation": format_recommendation(
+        clothes_advice, [(hobby, advice_of[target]) for hobby, target in zip(hobbies, resolved)]
+    )}
+    metrics.observe_stage(stage, time.perf_counter() - start)
+    return response
+
+def reset_recommend_cache(model):
+    if not recommend_cache.enabled:
+        return
+    recommend_cache.reset(model)
+    if RECOMMEND_WARM_HOBBIES:
+        task = asyncio.create_task(warm_recommend_cache(model, RECOMMEND_WARM_HOBBIES))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+async def warm_recommend_cache(model, hobby_lists):
+    """Precomputes /api/recommend answers for the hobby lists on every weather code x the
+    temperature/wind grid, in chunks through the inference executor. Stops at the cache size
+    or when the models are swapped meanwhile."""
+    start = time.perf_counter()
+    lists = [split_hobbies(hobbies) for hobbies in hobby_lists]
+    hobbies = sorted({h for hobby_list in lists for h in hobby_list})
+    column = {h: j for j, h in enumerate(hobbies)}
+    grid = list(itertools.product(RECOMMEND_WARM_TEMPERATURES, RECOMMEND_WARM_WINDS, WEATHER_CODES))
+    try:
+        for offset in range(0, len(grid), RECOMMEND_WARM_CHUNK):
+            points = grid[offset:offset + RECOMMEND_WARM_CHUNK]
+            temps, winds, codes = zip(*points)
+            clothing, texts = await inference.predict_grid(temps, winds, codes, hobbies)
+            if recommend_cache.recommender is not model:
+                return
+            for (temp, wind, code), clothes, row in zip(points, clothing, texts):
+                for hobby_list in lists:
+                    key, resolved = recommend_cache.key(temp, wind, code, hobby_list)
+                    advice = {target: row[column[h]] for h, target in zip(hobby_list, resolved)}
+                    recommend_cache.set(key, (clothes, advice), model)
+            if len(recommend_cache) >= recommend_cache.maxsize:
+                break
+    except Exception as e:
+        print(f"⚠️ [Cache] Warm-up of the recommend cache failed: {e!r}")
+        return
+    print(f"🔥 [Cache] Precomputed {len(recommend_cache)} recommend answers in {time.perf_counter() - start:.1f} s")
+
+MAX_BATCH_ITEMS = int(os.environ.get("WEATHER_MAX_BATCH_ITEMS", "10000"))
+
+class BatchRecommendRequest(BaseModel):
+    items: list[WeatherRequest]
+
+@app.post("/api/recommend/batch")
+async def recommend_batch(data: BatchRecommendRequest):
+    if len(data.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items (max {MAX_BATCH_ITEMS})")
+
+    results = await inference.predict_many(
+        (item.temperature, item.wind_speed, item.weather_code, split_hobbies(item.hobbies))
+        for item in data.items
+    )
+    return {"recommendations": [format_recommendation(c, h) for c, h in results]}
+
+# feedback becomes training rows: out-of-range or non-finite values would break every later fit
+FeedbackTemperature = Annotated[float, Field(ge=-90, le=60, allow_inf_nan=False)]
+FeedbackWindSpeed = Annotated[float, Field(ge=0, le=120, allow_inf_nan=False)]
+
+class FeedbackItem(BaseModel):
+    temperature: FeedbackTemperature
+    wind_speed: FeedbackWindSpeed
+    weather_code: int
+    clothing_id: int | None = None
+    hobby: str | None = None
+    advice_id: int | None = None
 
-OPEN_METEO_GEOCODE_URL = "https://geocoding-api.open-meteo.com/v1/search"
-OPEN_METEO_FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+class FeedbackRequest(BaseModel):
+    items: list[FeedbackItem]
+
+model_reload_lock = asyncio.Lock()
+
+def require_admin(x_admin_token: str = Header("")):
+    """Feedback retrains the models and a reload costs a rebuild: neither is open to anonymous clients."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Disabled (WEATHER_ADMIN_TOKEN is not set)")
+    if not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/api/feedback", dependencies=[Depends(require_admin)])
+async def post_feedback(data: FeedbackRequest):
+    """Appends corrected labels to the feedback log; POST /api/model/reload applies them."""
+    if len(data.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items (max {MAX_BATCH_ITEMS})")
+    for item in data.items:
+        if item.clothing_id is None and (item.hobby is None or item.advice_id is None):
+            raise HTTPException(status_code=400, detail="Each item needs clothing_id or hobby with advice_id")
+        if item.clothing_id is not None and item.clothing_id not in recommender.clothing_labels:
+            raise HTTPException(status_code=400, detail=f"Unknown clothing_id {item.clothing_id}")
+        if item.advice_id is not None and item.advice_id not in recommender.hobby_advice_map:
+            raise HTTPException(status_code=400, detail=f"Unknown advice_id {item.advice_id}")
+    size = await asyncio.to_thread(append_feedback, FEEDBACK_LOG, [item.model_dump() for item in data.items])
+    return {"accepted": len(data.items), "log_bytes": size}
+
+def build_recommender(engine):
+    new = UnifiedRecommender(engine)
+    new.load_and_train()
+    return new
+
+@app.post("/api/model/reload", dependencies=[Depends(require_admin)])
+async def reload_model():
+    """Rebuilds the recommender from the artifacts, HOBBY_CONFIG and the feedback log off the event
+    loop (incremental, no full refit) and swaps it in; requests in flight finish on the old one.
+    Under serve.py the supervisor does the rebuild once and replaces every worker instead."""
+    global recommender
+    if SUPERVISOR_PID:
+        os.kill(SUPERVISOR_PID, signal.SIGHUP)
+        return JSONResponse({"engine": recommender.engine, "update": recommender.update_id,
+                             "status": "reloading all workers"}, status_code=202)
+    async with model_reload_lock:
+        start = time.perf_counter()
+        new = await asyncio.to_thread(build_recommender, recommender.engine)
+        await inference.swap(new)
+        recommender = new
+        reset_recommend_cache(new)
+        elapsed = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.labels(new.engine).set(elapsed)
+        MODEL_TRAIN_SECONDS.labels(new.engine).set(new.train_seconds)
+    print(f"🔄 [ML] Swapped in models (update {new.update_id}) in {elapsed:.1f} s")
+    return {"engine": new.engine, "update": new.update_id, "feedback_bytes": new.feedback_size,
+            "hobbies": len(new.known_hobbies), "seconds": elapsed}
 
 @app.get("/", response_class=FileResponse)
 def serve_index():
@@ -67,35 +410,344 @@ def serve_index():
     if os.path.exists(index_path): return index_path
     return {"error": "Frontend files not found"}
 
+def normalize_city(city: str):
+    return " ".join(city.split()).casefold()
+
 async def geocode_city(city: str):
     city = city.strip()
     if not city: raise HTTPException(status_code=400, detail="Empty city")
+    key = normalize_city(city)
+    location = geocode_cache.get(key)
+    if location is MISSING:
+        location = await geocode_flight.do(key, lambda: lookup_city(key, city))
+    # None is a cached "unknown city" answer
+    if location is None: raise HTTPException(status_code=404, detail="City not found")
+    return location
+
+async def lookup_city(key: str, city: str):
+    if geocode_db is not None:
+        # SQLite is blocking I/O, kept off the event loop
+        stored = await asyncio.to_thread(geocode_db.get, key)
+        if stored is not MISSING:
+            location, ttl_left = stored
+            location = tuple(location) if location is not None else None
+            geocode_cache.set(key, location, ttl=ttl_left)
+            return location
+
     params = {"name": city, "count": 1, "language": "en", "format": "json"}
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        resp = await client.get(OPEN_METEO_GEOCODE_URL, params=params)
-    if resp.status_code != 200 or not resp.json().get("results"):
+    resp = await upstream_get("geocode", OPEN_METEO_GEOCODE_URL, params)
+    # Upstream failures are not cached, only a successful "no results" answer is
+    if resp.status_code != 200:
+        UPSTREAM_ERRORS.labels("geocode", "status").inc()
+        if resp.status_code in RETRY_STATUSES:
+            raise HTTPException(status_code=503, detail=upstream_unavailable["geocode"])
         raise HTTPException(status_code=404, detail="City not found")
-    r = resp.json()["results"][0]
-    return (r["latitude"], r["longitude"], r.get("name", city), r.get("country", ""))
+    results = resp.json().get("results")
+    if results:
+        r = results[0]
+        location, ttl = (r["latitude"], r["longitude"], r.get("name", city), r.get("country", "")), GEOCODE_TTL
+    else:
+        location, ttl = None, GEOCODE_NEGATIVE_TTL
 
-@app.get("/api/weather")
-async def get_weather(city: str, days: int = 3):
-    days = max(1, min(days, 16))
-    lat, lon, loc_name, country = await geocode_city(city)
+    geocode_cache.set(key, location, ttl=ttl)
+    if geocode_db is not None:
+        await asyncio.to_thread(geocode_db.set, key, location, ttl)
+    return location
+
+async def upstream_attempt(api, url, params, timeout):
+    start = time.perf_counter()
+    # wait_for bounds the whole attempt; httpx timeouts only bound each connect/read step
+    resp = await asyncio.wait_for(get_http_client().get(url, params=params), timeout)
+    if resp.status_code not in RETRY_STATUSES:
+        upstream_latency[api].add(time.perf_counter() - start)
+    return resp
+
+def hedge_delay(api, remaining):
+    if not UPSTREAM_HEDGE:
+        return None
+    p = upstream_latency[api].quantile(HEDGE_QUANTILE)
+    delay = max(p, HEDGE_MIN_DELAY) if p is not None else None
+    return delay if delay is not None and delay < remaining else None
+
+async def upstream_get(api, url, params):
+    """Idempotent GET against Open-Meteo. Transport errors, timeouts and 429/5xx answers are retried
+    with jittered backoff within the stage deadline; optionally a slow attempt is hedged. After
+    BREAKER_FAILURES failed calls in a row the API is not called for BREAKER_RESET seconds.
+    Returns the response (a final 4xx/5xx included) or raises a 503 HTTPException."""
+    breaker, stats = upstream_breakers[api], upstream_stats[api]
+    if not breaker.allow():
+        UPSTREAM_ERRORS.labels(api, "circuit_open").inc()
+        raise HTTPException(status_code=503, detail=upstream_unavailable[api])
+    stats["calls"] += 1
+    deadline, resp, outcome = Deadline(upstream_deadlines[api]), None, False
+    try:
+        with timed(api):
+            for attempt in range(UPSTREAM_RETRIES + 1):
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    break
+                try:
+                    resp = await hedged(lambda: upstream_attempt(api, url, params, deadline.remaining()),
+                                        hedge_delay(api, remaining), stats)
+                except asyncio.TimeoutError:
+                    UPSTREAM_ERRORS.labels(api, "timeout").inc()
+                    resp = None
+                except httpx.HTTPError:
+                    UPSTREAM_ERRORS.labels(api, "transport").inc()
+                    resp = None
+                if resp is not None and resp.status_code not in RETRY_STATUSES:
+                    breaker.success()
+                    outcome = True
+                    return resp
+                pause = backoff(attempt, UPSTREAM_BACKOFF, UPSTREAM_BACKOFF_CAP)
+                if attempt == UPSTREAM_RETRIES or pause >= deadline.remaining():
+                    break
+                stats["retries"] += 1
+                await asyncio.sleep(pause)
+        stats["failures"] += 1
+        breaker.failure()
+        outcome = True
+    finally:
+        if not outcome:
+            breaker.abandon()
+    if resp is not None:
+        return resp  # a final 429/5xx, the caller reports it as before
+    raise HTTPException(status_code=503, detail=upstream_unavailable[api])
+
+@app.get("/api/upstream/stats")
+def upstream_stats_view():
+    return {api: dict(stats, circuit=upstream_breakers[api].state, **upstream_breakers[api].stats,
+                      p95_ms=round((upstream_latency[api].quantile(0.95) or 0) * 1000, 1))
+            for api, stats in upstream_stats.items()}
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    stats = {
+        "geocode": dict(geocode_cache.stats, size=len(geocode_cache)),
+        "geocode_inflight": dict(geocode_flight.stats),
+        "forecast": dict(forecast_cache.stats, size=len(forecast_cache), **forecast_stats),
+        "forecast_inflight": dict(forecast_flight.stats),
+    }
+    if geocode_db is not None:
+        stats["geocode_db"] = dict(geocode_db.stats)
+    if recommend_cache.enabled:
+        stats["recommend"] = dict(recommend_cache.stats, size=len(recommend_cache),
+                                  hit_ratio=round(recommend_cache.hit_ratio(), 4))
+    return stats
+
+def cache_events():
+    return {(cache, event): value for cache, stats in cache_stats().items()
+            for event, value in stats.items() if event not in ("size", "hit_ratio")}
+
+metrics.Callback("weather_cache_events", "Cache and single-flight counters from /api/cache/stats",
+                 ["cache", "event"], cache_events, type="counter")
+metrics.Callback("weather_cache_entries", "Entries held per in-memory cache", ["cache"],
+                 lambda: {(cache,): stats["size"] for cache, stats in cache_stats().items() if "size" in stats})
+metrics.Callback("weather_upstream_events", "Upstream calls, retries, hedges and circuit breaker events",
+                 ["api", "event"], lambda: {(api, event): value for api, stats in upstream_stats.items()
+                                            for event, value in {**stats, **upstream_breakers[api].stats}.items()},
+                 type="counter")
+metrics.Callback("weather_upstream_circuit_open", "1 while calls to the upstream API are being rejected", ["api"],
+                 lambda: {(api,): int(breaker.rejecting()) for api, breaker in upstream_breakers.items()})
+metrics.Callback("weather_inference_batches", "Inference batches and the items in them", ["kind"],
+                 lambda: {(kind,): value for kind, value in inference.stats.items()}, type="counter")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def forecast_params(lat, lon, days: int, hourly: bool = False):
     params = {
         "latitude": lat, "longitude": lon, "current_weather": "true",
         "temperature_unit": "celsius", "windspeed_unit": "ms", "timezone": "auto",
-        "daily": "temperature_2m_max,temperature_2m_min,weathercode", "forecast_days": days,
+        "daily": "temperature_2m_max,temperature_2m_min,weathercode,windspeed_10m_max", "forecast_days": days,
     }
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        resp = await client.get(OPEN_METEO_FORECAST_URL, params=params)
-    if resp.status_code != 200: raise HTTPException(status_code=502, detail="Weather API error")
-    
+    if hourly:
+        params["hourly"] = "temperature_2m,windspeed_10m,weathercode"
+    return params
+
+async def fetch_forecast(lat: float, lon: float, days: int, hourly: bool = False):
+    resp = await upstream_get("forecast", OPEN_METEO_FORECAST_URL, forecast_params(lat, lon, days, hourly))
+    if resp.status_code != 200:
+        UPSTREAM_ERRORS.labels("forecast", "status").inc()
+        raise HTTPException(status_code=502, detail="Weather API error")
+    return resp.json()
+
+async def fetch_forecast_multi(coords, days: int):
+    """One upstream call for many locations: Open-Meteo takes comma-separated coordinates
+    and answers with a list in the same order (a plain object for a single location)."""
+    lats = ",".join(str(lat) for lat, _ in coords)
+    lons = ",".join(str(lon) for _, lon in coords)
+    resp = await upstream_get("forecast", OPEN_METEO_FORECAST_URL, forecast_params(lats, lons, days))
+    if resp.status_code != 200:
+        UPSTREAM_ERRORS.labels("forecast", "status").inc()
+        raise HTTPException(status_code=502, detail="Weather API error")
     data = resp.json()
+    data = data if isinstance(data, list) else [data]
+    if len(data) != len(coords): raise HTTPException(status_code=502, detail="Weather API error")
+    return data
+
+def next_forecast_update(now=None):
+    """Open-Meteo publishes model runs on a fixed cadence; cached data is fresh until the next one."""
+    now = time.time() if now is None else now
+    runs = math.floor((now - FORECAST_UPDATE_OFFSET) / FORECAST_UPDATE_INTERVAL) + 1
+    return runs * FORECAST_UPDATE_INTERVAL + FORECAST_UPDATE_OFFSET
+
+def slice_forecast(data, days):
+    sliced = dict(data)
+    for section, length in (("daily", days), ("hourly", days * 24)):
+        values = data.get(section)
+        if values and len(values.get("time", [])) > length:
+            sliced[section] = {k: v[:length] if isinstance(v, list) else v for k, v in values.items()}
+    return sliced
+
+def forecast_key(lat: float, lon: float, hourly: bool = False):
+    return (round(lat, FORECAST_COORD_DECIMALS), round(lon, FORECAST_COORD_DECIMALS), hourly)
+
+def store_forecast(key, days, data):
+    if data.get("current_weather"):
+        fresh_until = next_forecast_update()
+        forecast_cache.set(key, (days, data, fresh_until),
+                           ttl=fresh_until - time.time() + FORECAST_STALE_TTL + FORECAST_OFFLINE_TTL)
+
+async def refresh_forecast(key, days):
+    lat, lon, hourly = key
+    data = await fetch_forecast(lat, lon, days, hourly)
+    store_forecast(key, days, data)
+    return data
+
+async def load_forecast(key, days):
+    """Single-flight fetch: concurrent misses and refreshes of the same key share one upstream call."""
+    return await forecast_flight.do((key, days), lambda: refresh_forecast(key, days))
+
+async def revalidate_forecast(key, days):
+    try:
+        forecast_stats["refreshes"] += 1
+        await load_forecast(key, days)
+    except Exception as e:
+        forecast_stats["refresh_errors"] += 1
+        print(f"⚠️ [Forecast] Background refresh of {key} failed: {e!r}")
+
+def schedule_revalidation(key, days):
+    if forecast_flight.in_flight((key, days)) or upstream_breakers["forecast"].rejecting():
+        return
+    task = asyncio.create_task(revalidate_forecast(key, days))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def cached_forecast(key, days):
+    """Cached forecast covering at least `days` or None; stale entries are served and revalidated."""
+    entry = forecast_cache.get(key)
+    if entry is MISSING or entry[0] < days:
+        return None
+    cached_days, data, fresh_until = entry
+    if time.time() >= fresh_until + FORECAST_STALE_TTL:
+        return None  # too old to serve while the upstream works, see offline_forecast
+    if time.time() >= fresh_until:
+        forecast_stats["stale_served"] += 1
+        schedule_revalidation(key, cached_days)
+    return slice_forecast(data, days)
+
+def forecast_fetch_days(days):
+    return min(max(days, FORECAST_FETCH_DAYS), FORECAST_MAX_DAYS)
+
+async def get_forecast(lat: float, lon: float, days: int, hourly: bool = False):
+    """Cached forecast: keyed by rounded coordinates, a longer cached window serves shorter requests,
+    and stale entries are returned immediately while a background task refreshes them."""
+    key = forecast_key(lat, lon, hourly)
+    data = cached_forecast(key, days)
+    if data is not None:
+        return data
+    try:
+        return slice_forecast(await load_forecast(key, forecast_fetch_days(days)), days)
+    except HTTPException:
+        data = offline_forecast(key, days)
+        if data is None:
+            raise
+        return data
+
+def offline_forecast(key, days):
+    """Fallback when the upstream fails: the cached forecast however old, within FORECAST_OFFLINE_TTL."""
+    entry = forecast_cache.peek(key)
+    if entry is MISSING or entry[0] < days or time.time() >= entry[2] + FORECAST_STALE_TTL + FORECAST_OFFLINE_TTL:
+        return None
+    forecast_stats["offline_served"] += 1
+    return slice_forecast(entry[1], days)
+
+def forecast_points(data, days, hourly):
+    """Weather points to advise on as (temps, winds, codes) columns: current weather first,
+    then one point per forecast day (mean of min/max temperature, max wind), then every hour."""
+    current = data["current_weather"]
+    temps, winds, codes = [current["temperature"]], [current["windspeed"]], [current["weathercode"]]
+
+    d = data.get("daily") or {}
+    n_days = min(days, len(d.get("time", [])))
+    temp_max = d.get("temperature_2m_max", [])[:n_days]
+    temp_min = d.get("temperature_2m_min", [])[:n_days]
+    temps += [(hi + lo) / 2 if hi is not None and lo is not None else None for hi, lo in zip(temp_max, temp_min)]
+    winds += d.get("windspeed_10m_max", [None] * n_days)[:n_days]
+    codes += d.get("weathercode", [])[:n_days]
+
+    h = (data.get("hourly") or {}) if hourly else {}
+    n_hours = len(h.get("time", []))
+    temps += h.get("temperature_2m", [])
+    winds += h.get("windspeed_10m", [])
+    codes += h.get("weathercode", [])
+    # Open-Meteo sends null for missing values; NaN keeps the arrays numeric
+    nan = float("nan")
+    return ([nan if v is None else v for v in temps], [nan if v is None else v for v in winds],
+            [nan if v is None else v for v in codes], n_days, n_hours)
+
+def complete_point(temp, wind, code):
+    return all(v is not None and math.isfinite(v) for v in (temp, wind, code))
+
+async def advise_points(temps, winds, codes, hobbies):
+    """predict_grid over the points that have every value; the models would turn a missing one into
+    made-up advice, so those points get clothing None and no hobby advice."""
+    valid = [i for i, point in enumerate(zip(temps, winds, codes)) if complete_point(*point)]
+    clothing, hobby_texts = [None] * len(temps), [[] for _ in temps]
+    if valid:
+        found, texts = await inference.predict_grid(
+            [temps[i] for i in valid], [winds[i] for i in valid], [codes[i] for i in valid], hobbies
+        )
+        for i, clothes, row in zip(valid, found, texts):
+            clothing[i], hobby_texts[i] = clothes, row
+    return clothing, hobby_texts
+
+@app.get("/api/weather")
+async def get_weather(city: str, days: int = 3, advice: bool = False, hobbies: str = "", hourly: bool = False):
+    """With advice=true every forecast day (and every hour for hourly=true) also gets clothing
+    and hobby advice; all points x hobbies are predicted as one batch."""
+    days = max(1, min(days, FORECAST_MAX_DAYS))
+    lat, lon, loc_name, country = await geocode_city(city)
+    data = await get_forecast(lat, lon, days, hourly)
     current = data.get("current_weather")
     if not current: raise HTTPException(status_code=502, detail="No weather data")
 
-    ai_advice = recommender.predict_clothing(current["temperature"], current["windspeed"], current["weathercode"])
+    user_hobbies = split_hobbies(hobbies)
+    if advice:
+        temps, winds, codes, n_days, n_hours = forecast_points(data, days, hourly)
+        clothing, hobby_texts = await advise_points(temps, winds, codes, user_hobbies)
+    elif complete_point(current["temperature"], current["windspeed"], current["weathercode"]):
+        n_days, n_hours = 0, 0
+        current_clothing, current_hobbies = await inference.predict(
+            current["temperature"], current["windspeed"], current["weathercode"], user_hobbies
+        )
+        clothing, hobby_texts = [current_clothing], [[a for _, a in current_hobbies]]
+    else:
+        n_days, n_hours = 0, 0
+        clothing, hobby_texts = [None], [[]]
+
+    location = (lat, lon, loc_name, country)
+    return weather_result(location, data, days, hourly, user_hobbies, clothing, hobby_texts, n_days, n_hours)
+
+def weather_result(location, data, days, hourly, user_hobbies, clothing, hobby_texts, n_days, n_hours):
+    """/api/weather response body; clothing[i] / hobby_texts[i] follow the forecast_points order."""
+    lat, lon, loc_name, country = location
+    current = data["current_weather"]
+
+    def hobby_advice(i):
+        return [{"hobby": h, "advice": a} for h, a in zip(user_hobbies, hobby_texts[i])]
 
     forecast = []
     if data.get("daily"):
@@ -107,8 +759,177 @@ async def get_weather(city: str, days: int = 3):
                 "temp_min": d["temperature_2m_min"][i],
                 "weathercode": d["weathercode"][i],
             })
+            if i < n_days:
+                forecast[i]["ai_advice"] = clothing[1 + i]
+                forecast[i]["hobby_advice"] = hobby_advice(1 + i)
 
-    return {
+    result = {
         "location": {"name": loc_name, "country": country, "latitude": lat, "longitude": lon},
-        "current": current, "forecast": forecast, "ai_advice": ai_advice
-    }
\ No newline at end of file
+        "current": current, "forecast": forecast, "ai_advice": clothing[0]
+    }
+    if user_hobbies:
+        result["hobby_advice"] = hobby_advice(0)
+    if hourly:
+        h = data.get("hourly") or {}
+        result["hourly"] = []
+        for i in range(len(h.get("time", []))):
+            hour = {
+                "time": h["time"][i],
+                "temperature": h["temperature_2m"][i],
+                "windspeed": h["windspeed_10m"][i],
+                "weathercode": h["weathercode"][i],
+            }
+            if i < n_hours:
+                hour["ai_advice"] = clothing[1 + n_days + i]
+                hour["hobby_advice"] = hobby_advice(1 + n_days + i)
+            result["hourly"].append(hour)
+    return result
+
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
+
+class BulkWeatherRequest(BaseModel):
+    cities: list[str] = []
+    # Open-Meteo rejects a whole multi-location call for one out-of-range pair
+    coordinates: list[tuple[Latitude, Longitude]] = []
+    days: int = 1
+    hobbies: str = ""
+
+def ndjson_line(obj):
+    with timed("serialization"):
+        return json.dumps(obj, ensure_ascii=False) + "\n"
+
+async def bulk_locate(queries, semaphore):
+    """Geocodes the city queries concurrently, at most BULK_CONCURRENCY upstream lookups at a time.
+    Yields (query, location) or (query, HTTPException) in completion order."""
+    async def locate(query):
+        if not isinstance(query, str):
+            return query, (query[0], query[1], None, None)
+        async with semaphore:
+            try:
+                return query, await geocode_city(query)
+            except HTTPException as e:
+                return query, e
+
+    for done in asyncio.as_completed([locate(q) for q in queries]):
+        yield await done
+
+async def bulk_forecast_chunk(keys, days, semaphore):
+    """Fetches one chunk of uncached locations with a single multi-location call and caches them.
+    Returns (keys, {key: forecast}) or (keys, None) when the upstream call failed."""
+    fetch_days = forecast_fetch_days(days)
+    try:
+        async with semaphore:
+            results = await fetch_forecast_multi([key[:2] for key in keys], fetch_days)
+    except (HTTPException, httpx.HTTPError) as e:
+        print(f"⚠️ [Bulk] Forecast for {len(keys)} locations failed: {e!r}")
+        fallback = {key: data for key in keys if (data := offline_forecast(key, days)) is not None}
+        return keys, fallback or None
+    chunk = {}
+    for key, data in zip(keys, results):
+        store_forecast(key, fetch_days, data)
+        chunk[key] = slice_forecast(data, days)
+    return keys, chunk
+
+async def bulk_weather_lines(queries, days, user_hobbies):
+    """Pipelined: forecast chunks are fetched (and answered) while the remaining cities are still
+    being geocoded. Forecasts land in the shared cache, so a later query for an already answered
+    point is a cache hit."""
+    # separate limits, so queued geocode lookups do not hold back the forecast chunks
+    geocode_slots, forecast_slots = asyncio.Semaphore(BULK_CONCURRENCY), asyncio.Semaphore(BULK_CONCURRENCY)
+    # forecast key -> [(query, location)] not answered yet; several queries can share a rounded point
+    by_key = {}
+    hits, misses, pending = {}, [], set()
+
+    def errors(keys, detail):
+        return "".join(ndjson_line({"query": query, "error": detail, "status": 502})
+                       for key in keys for query, _ in by_key.pop(key, []))
+
+    async def advise(chunk):
+        """One predict_grid call for every location of the chunk: current weather plus each day."""
+        empty = [key for key, data in chunk.items() if not data.get("current_weather")]
+        chunk = {key: data for key, data in chunk.items() if data.get("current_weather")}
+        points, spans = ([], [], []), []
+        for data in chunk.values():
+            temps, winds, codes, n_days, _ = forecast_points(data, days, False)
+            spans.append((len(points[0]), n_days))
+            for column, values in zip(points, (temps, winds, codes)):
+                column.extend(values)
+        clothing, hobby_texts = await advise_points(*points, user_hobbies)
+
+        lines = []
+        for (key, data), (start, n_days) in zip(chunk.items(), spans):
+            end = start + 1 + n_days
+            for query, location in by_key.pop(key, []):
+                result = weather_result(location, data, days, False, user_hobbies,
+                                        clothing[start:end], hobby_texts[start:end], n_days, 0)
+                lines.append(ndjson_line({"query": query, **result}))
+        return "".join(lines) + errors(empty, "No weather data")
+
+    async def answer(task):
+        keys, chunk = task.result()
+        # keys the chunk does not answer (no offline fallback for them) get an error line
+        return (await advise(chunk) if chunk else "") + errors(keys, "Weather API error")
+
+    def fetch(keys):
+        pending.add(asyncio.ensure_future(bulk_forecast_chunk(keys, days, forecast_slots)))
+
+    try:
+        async for query, location in bulk_locate(queries, geocode_slots):
+            if isinstance(location, HTTPException):
+                yield ndjson_line({"query": query, "error": location.detail, "status": location.status_code})
+                continue
+            key = forecast_key(location[0], location[1])
+            if key in by_key:
+                by_key[key].append((query, location))
+                continue
+            by_key[key] = [(query, location)]
+            data = cached_forecast(key, days)
+            if data is not None:
+                hits[key] = data
+            else:
+                misses.append(key)
+
+            if len(hits) >= BULK_CHUNK:
+                yield await advise(hits)
+                hits = {}
+            if len(misses) >= BULK_CHUNK:
+                fetch(misses)
+                misses = []
+            for task in [t for t in pending if t.done()]:
+                pending.discard(task)
+                yield await answer(task)
+
+        if hits:
+            yield await advise(hits)
+        if misses:
+            fetch(misses)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                yield await answer(task)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@app.post("/api/weather/bulk")
+async def get_weather_bulk(data: BulkWeatherRequest):
+    """Weather and advice for many cities and/or (lat, lon) pairs in one request, streamed as NDJSON:
+    one JSON object per query (the /api/weather?advice=true body plus "query", or "error"/"status").
+    Duplicates are answered once, cached forecasts first, the rest with chunked multi-location
+    upstream calls as they complete."""
+    if len(data.cities) + len(data.coordinates) > BULK_MAX_LOCATIONS:
+        raise HTTPException(status_code=413, detail=f"Too many locations (max {BULK_MAX_LOCATIONS})")
+    days = max(1, min(data.days, FORECAST_MAX_DAYS))
+
+    queries = {}
+    for city in data.cities:
+        queries.setdefault(("city", normalize_city(city)), city)
+    for lat, lon in data.coordinates:
+        queries.setdefault(("point", lat, lon), [lat, lon])
+    return StreamingResponse(
+        bulk_weather_lines(list(queries.values()), days, split_hobbies(data.hobbies)),
+        media_type="application/x-ndjson",
+    )
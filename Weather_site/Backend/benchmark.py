@@ -0,0 +1,1118 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import generate_data
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# WEATHER_ADMIN_TOKEN of the apps the benchmarks start, for /api/feedback and /api/model/reload
+ADMIN_TOKEN = "benchmark"
+
+
+def _timed_subprocess(code, env=None):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def bench_cold_start(args):
+    """Cold start of a fresh worker process: full training vs loading the saved artifact."""
+    env = dict(os.environ, WEATHER_MODEL_DIR=args.model_dir)
+    code = "from ml_engine import recommender; recommender.load_and_train()"
+
+    model_dir = os.path.join(BACKEND_DIR, args.model_dir)
+    shutil.rmtree(model_dir, ignore_errors=True)
+    # Dataset generation must not be part of the measurement.
+    if not generate_data.dataset_exists():
+        generate_data.generate_datasets()
+
+    without = _timed_subprocess(code, env)
+    with_artifact = [_timed_subprocess(code, env) for _ in range(args.repeat)]
+    best = min(with_artifact)
+
+    print(f"cold start, train + save artifact: {without:8.2f} s")
+    print(f"cold start, load artifact (best of {args.repeat}): {best:8.2f} s")
+    print(f"speedup: x{without / best:.1f}")
+
+
+def bench_datagen(args):
+    """Vectorized dataset generation speed, plus a label check against the scalar rules."""
+    from harness import label_mismatches
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        generate_data.generate_datasets(args.samples, chunk_size=args.chunk_size,
+                                        clothing_path=os.path.join(tmp, "dataset.csv"),
+                                        hobby_path=os.path.join(tmp, "hobbies.csv"),
+                                        data_format=args.format, data_dir=os.path.join(tmp, "training_data"))
+        elapsed = time.perf_counter() - start
+    print(f"generate_datasets({args.samples}, {args.format}): {elapsed:.2f} s "
+          f"({args.samples / elapsed:,.0f} rows/s)")
+
+    mismatches = label_mismatches(args.check, args.seed)
+    print(f"label check on {args.check} rows (seed {args.seed}): {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+
+def _load_in_subprocess(data_format, tmp):
+    """(seconds, peak RSS in MB) of load_training_data() in a fresh process."""
+    code = ("import time, generate_data\n"
+            "start = time.perf_counter()\n"
+            f"data = generate_data.load_training_data({data_format!r}, data_dir='training_data')\n"
+            "elapsed = time.perf_counter() - start\n"
+            "hwm = [l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0]\n"
+            "print(elapsed, hwm)")
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    elapsed, hwm = out.strip().splitlines()[-1].split()
+    return float(elapsed), int(hwm) / 1024
+
+
+def bench_dataformat(args):
+    """Training data as CSV vs typed npy columns: generation, disk size, load time and peak memory
+    of a fresh loader process, and a check that both load to the same arrays."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes, gen_times = {}, {}
+        for data_format in generate_data.DATA_FORMATS:
+            start = time.perf_counter()
+            generate_data.generate_datasets(args.samples, chunk_size=args.chunk_size, data_format=data_format,
+                                            clothing_path=os.path.join(tmp, "dataset.csv"),
+                                            hobby_path=os.path.join(tmp, "hobbies.csv"),
+                                            data_dir=os.path.join(tmp, "training_data"))
+            gen_times[data_format] = time.perf_counter() - start
+            files = generate_data.dataset_files(data_format, os.path.join(tmp, "training_data"),
+                                                os.path.join(tmp, "dataset.csv"), os.path.join(tmp, "hobbies.csv"))
+            sizes[data_format] = sum(os.path.getsize(path) for path in files) / 2 ** 20
+
+        print(f"{args.samples:,} rows")
+        for data_format in generate_data.DATA_FORMATS:
+            loads = [_load_in_subprocess(data_format, tmp) for _ in range(args.repeat)]
+            load_s = min(seconds for seconds, _ in loads)
+            print(f"{data_format:>4}: generate {gen_times[data_format]:6.2f} s, {sizes[data_format]:7.1f} MB on disk, "
+                  f"load {load_s:6.2f} s (best of {args.repeat}), peak RSS {loads[0][1]:7.1f} MB")
+
+        csv = generate_data.load_training_data("csv", clothing_path=os.path.join(tmp, "dataset.csv"),
+                                               hobby_path=os.path.join(tmp, "hobbies.csv"))
+        npy = generate_data.load_training_data("npy", data_dir=os.path.join(tmp, "training_data"))
+    same = all(a == b if isinstance(a, list) else np.array_equal(a, b) for a, b in zip(csv, npy))
+    print(f"csv and npy load to identical arrays: {same}")
+    if not same:
+        sys.exit(1)
+
+
+def _random_items(n, hobbies_per_item, seed=0):
+    rng = np.random.RandomState(seed)
+    hobbies = generate_data.all_hobbies() + ["бег", "велик", "рыбалка", "шахматы"]
+    return [
+        (round(float(rng.uniform(-30, 40)), 1), round(float(rng.uniform(0, 25)), 1),
+         int(rng.choice(generate_data.WEATHER_CODES)),
+         [hobbies[j] for j in rng.randint(0, len(hobbies), hobbies_per_item)])
+        for _ in range(n)
+    ]
+
+
+def _loaded_recommender():
+    from ml_engine import recommender
+    recommender.load_and_train()
+    return recommender
+
+
+def bench_batch(args):
+    """Throughput of predict_batch vs calling predict_clothing/predict_hobby per item."""
+    recommender = _loaded_recommender()
+    items = _random_items(args.items, args.hobbies)
+
+    start = time.perf_counter()
+    loop_results = [
+        (recommender.predict_clothing(t, w, c), [(h, recommender.predict_hobby(t, w, c, h)) for h in hs])
+        for t, w, c, hs in items
+    ]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_results = recommender.predict_batch(items)
+    batch_time = time.perf_counter() - start
+
+    print(f"{args.items} items x {args.hobbies} hobbies")
+    print(f"per-item loop: {loop_time:8.3f} s ({args.items / loop_time:10,.0f} items/s)")
+    print(f"predict_batch: {batch_time:8.3f} s ({args.items / batch_time:10,.0f} items/s)")
+    print(f"speedup: x{loop_time / batch_time:.1f}, identical results: {loop_results == batch_results}")
+
+
+def bench_engines(args):
+    """Single-query and batch latency of the forest vs the compiled rules engine."""
+    from ml_engine import UnifiedRecommender
+    forest = UnifiedRecommender("forest")
+    forest.load_and_train()
+    rules = UnifiedRecommender("rules")
+    items = _random_items(args.queries, 1)
+
+    for name, rec in (("forest", forest), ("rules", rules)):
+        start = time.perf_counter()
+        for t, w, c, hs in items:
+            rec.predict_clothing(t, w, c)
+            rec.predict_hobby(t, w, c, hs[0])
+        single = (time.perf_counter() - start) / args.queries
+
+        batch_items = _random_items(args.batch, 1, seed=1)
+        start = time.perf_counter()
+        rec.predict_batch(batch_items)
+        batch = time.perf_counter() - start
+        print(f"{name:>6}: single query {single * 1e6:10.1f} us, "
+              f"batch of {args.batch}: {batch * 1e3:8.1f} ms")
+
+    rates = forest.engine_disagreement(args.samples)
+    print(f"disagreement on {args.samples} random queries: "
+          f"clothing {rates['clothing']:.2%}, hobby {rates['hobby']:.2%}")
+
+
+@contextlib.contextmanager
+def stub_upstream(port, latency_ms=0):
+    """Runs stub_upstream.py in a uvicorn subprocess and points App at it."""
+    env = dict(os.environ, STUB_LATENCY_MS=str(latency_ms))
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "stub_upstream:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+    base = f"http://127.0.0.1:{port}"
+    os.environ["OPEN_METEO_GEOCODE_URL"] = f"{base}/v1/search"
+    os.environ["OPEN_METEO_FORECAST_URL"] = f"{base}/v1/forecast"
+    try:
+        import httpx
+        for _ in range(100):
+            try:
+                httpx.get(f"{base}/stats")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        yield base
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _percentiles(latencies):
+    values = np.array(latencies) * 1000
+    return {f"p{q}": float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+
+async def _drive(client, paths, concurrency):
+    """Sends requests with a fixed number of concurrent callers. Each entry is a GET path
+    or a (method, path, json_body) tuple."""
+    queue = list(reversed(paths))
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            item = queue.pop()
+            method, path, body = ("GET", item, None) if isinstance(item, str) else item
+            start = time.perf_counter()
+            resp = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def bench_pool(args):
+    """/api/weather against the stub upstream with a pooled keep-alive client vs a new connection per call."""
+    import httpx
+
+    with stub_upstream(args.port, args.latency_ms):
+        import App
+        App.recommender.load_and_train()
+        paths = [f"/api/weather?city=city{i % args.cities}" for i in range(args.requests)]
+
+        async def run(keepalive):
+            App.HTTP_MAX_KEEPALIVE = args.keepalive if keepalive else 0
+            App.http_client = None
+            transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+                result = await _drive(client, paths, args.concurrency)
+            await App.http_client.aclose()
+            return result
+
+        for keepalive in (False, True):
+            elapsed, latencies, errors = asyncio.run(run(keepalive))
+            pct = _percentiles(latencies)
+            label = "pooled keep-alive" if keepalive else "no keep-alive"
+            print(f"{label:>18}: {len(paths) / elapsed:8.1f} req/s, p50 {pct['p50']:6.1f} ms, "
+                  f"p99 {pct['p99']:6.1f} ms, errors {errors}")
+
+
+def bench_coalescing(args):
+    """Upstream calls made by a burst of concurrent /api/weather requests for a few cold cities."""
+    import httpx
+
+    with stub_upstream(args.port, args.latency_ms) as stub:
+        import App
+        App.recommender.load_and_train()
+        paths = [f"/api/weather?city=city{i % args.cities}" for i in range(args.requests)]
+
+        async def run(enabled):
+            App.geocode_flight.enabled = App.forecast_flight.enabled = enabled
+            App.geocode_cache.clear()
+            App.forecast_cache.clear()
+            App.http_client = None
+            httpx.post(f"{stub}/stats/reset")
+            transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+                result = await _drive(client, paths, args.requests)
+            await App.http_client.aclose()
+            return result
+
+        for enabled in (False, True):
+            elapsed, latencies, errors = asyncio.run(run(enabled))
+            calls = httpx.get(f"{stub}/stats").json()
+            pct = _percentiles(latencies)
+            label = "single-flight" if enabled else "no coalescing"
+            print(f"{label:>14}: geocode calls {calls['geocode']:5d}, forecast calls {calls['forecast']:5d}, "
+                  f"p99 {pct['p99']:7.1f} ms, {elapsed:.2f} s, errors {errors}")
+
+
+async def _loop_lag(stop, interval=0.005):
+    """Samples how late the event loop wakes up a sleeping task."""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+    return lags
+
+
+def bench_inference(args):
+    """/api/recommend under concurrent load: event-loop lag and throughput per executor kind."""
+    import httpx
+    import App
+    from inference import InferenceExecutor
+
+    App.recommender.load_and_train()
+    body = [{"temperature": t, "wind_speed": w, "weather_code": c, "hobbies": ", ".join(hs)}
+            for t, w, c, hs in _random_items(args.requests, args.hobbies)]
+
+    async def run(kind):
+        App.inference = InferenceExecutor(App.recommender, kind, workers=args.workers,
+                                          batch_window=args.window_ms / 1000)
+        App.inference.start()
+        if kind == "process":
+            await App.inference.predict_many(_random_items(args.workers * 4, 1))  # warm up workers
+        transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(_loop_lag(stop))
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            sem = asyncio.Semaphore(args.concurrency)
+
+            async def one(payload):
+                async with sem:
+                    return await client.post("/api/recommend", json=payload)
+
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(one(p) for p in body))
+            elapsed = time.perf_counter() - start
+        stop.set()
+        lags = await lag_task
+        App.inference.shutdown()
+        errors = sum(r.status_code != 200 for r in responses)
+        return elapsed, lags, errors, dict(App.inference.stats)
+
+    for kind in args.kinds:
+        elapsed, lags, errors, stats = asyncio.run(run(kind))
+        lag = _percentiles(lags)
+        print(f"{kind:>8}: {args.requests / elapsed:8.1f} req/s, loop lag p50 {lag['p50']:7.1f} ms, "
+              f"p99 {lag['p99']:7.1f} ms, max {max(lags) * 1000:7.1f} ms, "
+              f"{stats['batches']} batches, errors {errors}")
+
+
+def _engine_rss_mb(engine):
+    """Peak RSS of a fresh process that loads one engine and answers one query."""
+    # VmHWM rather than ru_maxrss: the latter survives exec and would report this process' peak
+    code = ("from ml_engine import UnifiedRecommender\n"
+            f"r = UnifiedRecommender({engine!r}); r.predict_hobby(10, 3, 0, 'running')\n"
+            "print([l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0])")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, check=True,
+                         capture_output=True, text=True).stdout
+    return int(out.strip().splitlines()[-1]) / 1024
+
+
+def bench_flat(args):
+    """Flattened forests vs sklearn: size/accuracy trade-off, memory per worker and latency."""
+    from flat_forest import choose_limits, size_accuracy_report
+    from ml_engine import UnifiedRecommender
+
+    forest = UnifiedRecommender("forest")
+    forest.load_and_train()
+    flat = UnifiedRecommender("flat")
+    flat.load_and_train()
+
+    # fresh queries labelled by the generating rules, not rows the forests were trained on
+    rng = np.random.RandomState(7)
+    weather = np.column_stack([rng.uniform(-35, 42, args.rows).round(1), rng.uniform(0, 30, args.rows).round(1),
+                               rng.choice(generate_data.WEATHER_CODES, args.rows)])
+    hobby_idx = rng.randint(0, len(forest.rule_table["hobbies"]), args.rows)
+    X = np.column_stack([weather, [forest.hobby_codes[forest.rule_table["hobbies"][i]] for i in hobby_idx]])
+    y = generate_data.hobby_labels(weather[:, 0], weather[:, 1], weather[:, 2], hobby_idx, forest.rule_table)
+    report = size_accuracy_report(forest.hobby_model, X, y)
+    print("hobby model exports (agreement = same prediction as the full sklearn forest):")
+    for r in report:
+        print(f"  trees {r['trees']:3d}  depth {str(r['max_depth']):>4}  nodes {r['nodes']:8d}  "
+              f"{r['bytes'] / 1e6:7.1f} MB  agreement {r['agreement']:.4f}  accuracy {r['accuracy']:.4f}")
+    best = choose_limits(report, args.min_agreement)
+    print(f"smallest export with agreement >= {args.min_agreement}: "
+          f"WEATHER_FLAT_MAX_TREES={best['trees']} WEATHER_FLAT_MAX_DEPTH={best['max_depth'] or ''}")
+
+    same = np.mean(flat.hobby_flat.predict(X) == forest.hobby_model.predict(X))
+    print(f"full flat export vs sklearn on {args.rows} rows: {same:.4%} identical")
+
+    items = _random_items(args.queries, 1)
+    batch = _random_items(args.batch, 1, seed=1)
+    for name, rec in (("forest", forest), ("flat", flat)):
+        start = time.perf_counter()
+        for t, w, c, hs in items:
+            rec.predict_hobby(t, w, c, hs[0])
+        single = (time.perf_counter() - start) / len(items)
+        start = time.perf_counter()
+        rec.predict_batch(batch)
+        batch_time = time.perf_counter() - start
+        print(f"{name:>6}: predict_hobby {single * 1e6:9.1f} us, batch of {args.batch}: {batch_time * 1e3:8.1f} ms, "
+              f"peak RSS of a worker {_engine_rss_mb(name):7.1f} MB")
+
+
+def bench_bulk(args):
+    """A notification cycle for many cities: one /api/weather call per city vs one /api/weather/bulk stream."""
+    import httpx
+
+    with stub_upstream(args.port, args.latency_ms) as stub:
+        import App
+        App.recommender.load_and_train()
+        cities = [f"city{i}" for i in range(args.cities)]
+
+        async def run(bulk):
+            App.geocode_cache.clear()
+            App.forecast_cache.clear()
+            App.http_client = None
+            httpx.post(f"{stub}/stats/reset")
+            transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as client:
+                start = time.perf_counter()
+                if bulk:
+                    # duplicates are answered once; ASGITransport buffers the body, so no time-to-first-line here
+                    body = {"cities": cities + cities[:args.cities // 10], "days": args.days, "hobbies": "бег"}
+                    resp = await client.post("/api/weather/bulk", json=body)
+                    results = [json.loads(line) for line in resp.text.splitlines() if line]
+                    errors = sum("error" in r for r in results)
+                else:
+                    results = [f"/api/weather?city={c}&days={args.days}&advice=true&hobbies=бег" for c in cities]
+                    _, _, errors = await _drive(client, results, args.concurrency)
+                elapsed = time.perf_counter() - start
+            await App.http_client.aclose()
+            return elapsed, len(results), errors
+
+        for bulk in (False, True):
+            elapsed, n, errors = asyncio.run(run(bulk))
+            calls = httpx.get(f"{stub}/stats").json()
+            label = "bulk NDJSON" if bulk else "per-city"
+            print(f"{label:>11}: {n:5d} results in {elapsed:6.2f} s, geocode calls {calls['geocode']:5d}, "
+                  f"forecast calls {calls['forecast']:5d}, errors {errors}")
+
+        async def out_of_range():
+            transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+                body = {"coordinates": [[55.75, 37.62], [91.0, 0.0]], "days": args.days}
+                return (await client.post("/api/weather/bulk", json=body)).status_code
+
+        status = asyncio.run(out_of_range())
+        print(f"out-of-range coordinate: HTTP {status}")
+        if status != 422:
+            sys.exit("an out-of-range coordinate must be rejected before it reaches the upstream")
+
+
+def bench_metrics(args):
+    """/metrics after a known sequence of requests and the instrumentation cost."""
+    import metrics
+    from harness import metric_delta, metrics_after_requests
+
+    # the expected values are checked by tests/test_metrics.py; here the counts are reported
+    _, before, after = metrics_after_requests(args.requests)
+    stages = sorted({dict(labels)["stage"] for name, labels in after if name == "weather_stage_seconds_count"})
+    for stage in stages:
+        count = metric_delta(before, after, "weather_stage_seconds_count", stage=stage)
+        seconds = metric_delta(before, after, "weather_stage_seconds_sum", stage=stage)
+        if count:
+            print(f"{stage:>24}: {count:5.0f} observations, mean {seconds / count * 1e3:7.3f} ms")
+
+    hist = metrics.Histogram("bench_seconds", "", ["stage"], registry=None)
+    start = time.perf_counter()
+    for i in range(args.observations):
+        hist.labels("x").observe(0.001)
+    per_observe = (time.perf_counter() - start) / args.observations
+    print(f"cost of one observation: {per_observe * 1e9:.0f} ns")
+
+
+def _git_revision():
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=BACKEND_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    try:
+        return git("rev-parse", "--short", "HEAD"), bool(git("status", "--porcelain", "--", "."))
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def _per_call(fn, calls, repeat, before_pass=None):
+    """Per-call time over `repeat` passes through calls; the median pass is the headline number."""
+    passes = []
+    for _ in range(repeat):
+        if before_pass is not None:
+            before_pass()
+        start = time.perf_counter()
+        for call_args in calls:
+            fn(*call_args)
+        passes.append((time.perf_counter() - start) / len(calls))
+    return {"calls": len(calls), "repeat": repeat,
+            "median_us": float(np.median(passes)) * 1e6, "best_us": min(passes) * 1e6}
+
+
+def _micro_benchmarks(args):
+    from ml_engine import UnifiedRecommender
+    rec = UnifiedRecommender(args.engine)
+    rec.load_and_train()
+    weather = [(t, w, c) for t, w, c, _ in _random_items(args.calls, 0, seed=args.seed)]
+    known = sorted(rec.known_hobbies)
+    aliases = sorted(rec.ru_to_en)
+    # fragments resolve through the substring index, the rest falls back to the default hobby;
+    # the LRU is cleared before every pass so each lookup pays for the search
+    unknown = [known[i % len(known)][1:5] if i % 2 else f"хобби {i}" for i in range(len(weather))]
+
+    def hobby_calls(names):
+        return [(t, w, c, names[i % len(names)]) for i, (t, w, c) in enumerate(weather)]
+
+    results = {
+        "predict_clothing": _per_call(rec.predict_clothing, weather, args.repeat),
+        "predict_hobby_known": _per_call(rec.predict_hobby, hobby_calls(known), args.repeat),
+        "predict_hobby_alias": _per_call(rec.predict_hobby, hobby_calls(aliases), args.repeat),
+        "predict_hobby_unknown": _per_call(rec.predict_hobby, hobby_calls(unknown), args.repeat,
+                                           rec.hobby_index.resolve_free.cache_clear),
+    }
+
+    env = dict(os.environ, WEATHER_ML_ENGINE=args.engine)
+    code = "from ml_engine import recommender; recommender.load_and_train()"
+    loads = [_timed_subprocess(code, env) for _ in range(args.repeat)]
+    results["load_and_train_artifact"] = {"repeat": args.repeat, "median_s": float(np.median(loads)),
+                                          "best_s": min(loads)}
+    if not args.skip_train:
+        code = "from ml_engine import recommender; recommender.load_and_train(use_artifact=False)"
+        results["load_and_train_fit"] = {"repeat": 1, "median_s": _timed_subprocess(code, env)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            generate_data.generate_datasets(args.datagen_samples, seed=args.seed,
+                                            clothing_path=os.path.join(tmp, "dataset.csv"),
+                                            hobby_path=os.path.join(tmp, "hobbies.csv"),
+                                            data_dir=os.path.join(tmp, "training_data"))
+            runs.append(time.perf_counter() - start)
+    results["generate_datasets"] = {"samples": args.datagen_samples, "repeat": args.repeat,
+                                    "median_s": float(np.median(runs)), "best_s": min(runs)}
+    return results
+
+
+def _process_memory_mb(pid):
+    """Current and peak resident memory of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except OSError:
+        return None, None
+    return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+
+
+@contextlib.contextmanager
+def app_server(port, env=None, command=None):
+    """App under uvicorn in a subprocess, as deployed; yields (base_url, pid) once the models are loaded.
+    command replaces the default `uvicorn App:app` arguments, e.g. to run serve.py."""
+    import httpx
+
+    command = command or ["-m", "uvicorn", "App:app", "--log-level", "warning"]
+    proc = subprocess.Popen([sys.executable, *command, "--port", str(port)], cwd=BACKEND_DIR,
+                            env=dict(os.environ, **(env or {})), stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(1200):
+            try:
+                httpx.get(f"{base}/api/cache/stats")
+                break
+            except httpx.TransportError:
+                if proc.poll() is not None:
+                    raise RuntimeError("App server exited during startup")
+                time.sleep(0.1)
+        yield base, proc.pid
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def bench_recommend_cache(args):
+    """/api/recommend with the memo cache: every cached answer is checked against the uncached
+    path (including inputs right at the model thresholds), plus hit ratio, latency and warm-up."""
+    from harness import app_client, compare_cached, recommend_stream, send, use_engine
+
+    use_engine(args.engine)
+
+    async def plain_latencies():
+        async with app_client() as (App, client):
+            size, App.recommend_cache.maxsize = App.recommend_cache.maxsize, 0
+            try:
+                return (await send(client, recommend_stream(args.requests, args.seed)))[1]
+            finally:
+                App.recommend_cache.maxsize = size
+
+    plain = asyncio.run(plain_latencies())
+    result = compare_cached(args.engine, args.requests, args.probes, args.seed, args.warm)
+    stream, stats = result["stream"], result["stats"]
+
+    import App
+    # the miss that filled an entry ran with other inputs than the hits served from it
+    hit_flags = []
+    seen = set()
+    for body in stream:
+        key = App.recommend_cache.key(body["temperature"], body["wind_speed"], body["weather_code"],
+                                      App.split_hobbies(body["hobbies"]))[0]
+        hit_flags.append(key in seen)
+        seen.add(key)
+    hit_flags = np.array(hit_flags)
+    latencies = np.array(result["latencies"])
+
+    print(f"engine {args.engine}, {args.requests} requests, {len(seen)} distinct keys")
+    print(f"hit ratio {stats['hits'] / (stats['hits'] + stats['misses']):.3f} "
+          f"({stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions)")
+    for name, values in (("uncached", np.array(plain)), ("cache hit", latencies[hit_flags]),
+                         ("cache miss", latencies[~hit_flags])):
+        pct = _percentiles(values)
+        print(f"{name:>10}: p50 {pct['p50']:6.2f} ms, p99 {pct['p99']:6.2f} ms ({len(values)} requests)")
+    print(f"warm-up of {len(args.warm)} hobby lists: {result['warm_entries']} entries in "
+          f"{result['warm_seconds']:.1f} s, then hit ratio {result['warm_hits'] / len(stream):.3f}")
+    print(f"cached vs uncached answers: {result['mismatches']} mismatches in {2 * len(stream)}, "
+          f"{result['probe_mismatches']} in {result['probes']} threshold probes")
+    if result["mismatches"] or result["probe_mismatches"]:
+        sys.exit(1)
+
+
+def _resilience_config(App, enabled, breaker_reset):
+    """The upstream layer on, or off (one attempt, the old 5 s timeout, no breaker or fallback)."""
+    from resilience import CircuitBreaker, LatencyTracker
+
+    App.UPSTREAM_RETRIES = 2 if enabled else 0
+    App.UPSTREAM_HEDGE = enabled
+    App.FORECAST_OFFLINE_TTL = 24 * 3600 if enabled else 0
+    App.FORECAST_STALE_TTL = 3600
+    for api in App.upstream_deadlines:
+        App.upstream_deadlines[api] = {"geocode": 4.0, "forecast": 8.0}[api] if enabled else App.HTTP_TIMEOUT
+        App.upstream_breakers[api] = CircuitBreaker(5 if enabled else 10 ** 9, breaker_reset)
+        App.upstream_latency[api] = LatencyTracker()
+        App.upstream_stats[api] = dict.fromkeys(App.upstream_stats[api], 0)
+    App.geocode_cache.clear()
+    App.forecast_cache.clear()
+    for key in App.forecast_stats:
+        App.forecast_stats[key] = 0
+
+
+def bench_resilience(args):
+    """/api/weather against a fault-injecting stub with the upstream layer off and on: 503 bursts,
+    a slow tail (hedging) and an outage after the cache was filled (circuit breaker + offline
+    fallback). Every request uses a new city, so each one reaches the upstream."""
+    import httpx
+
+    with stub_upstream(args.port, args.latency_ms) as stub:
+        import App
+
+        async def drive(client, cities):
+            return await _drive(client, [f"/api/weather?city={c}&days=1" for c in cities], args.concurrency)
+
+        async def run(enabled):
+            _resilience_config(App, enabled, args.breaker_reset)
+            await App.startup_event()
+            results = {}
+            transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as client:
+                httpx.post(f"{stub}/faults", json={"error_rate": 0, "slow_rate": 0, "down": False, "seed": 1})
+                await drive(client, [f"warm{i}" for i in range(50)])  # latency history for the hedge delay
+
+                scenarios = {
+                    "errors": {"error_rate": args.error_rate},
+                    "slow tail": {"slow_rate": args.slow_rate, "slow_ms": args.slow_ms},
+                }
+                for name, faults in scenarios.items():
+                    httpx.post(f"{stub}/faults", json={"error_rate": 0, "slow_rate": 0, "down": False,
+                                                      "seed": 2, **faults})
+                    cities = [f"{name}-{i}" for i in range(args.requests)]
+                    results[name] = await drive(client, cities)
+
+                # outage: the cities were answered before, their forecasts are now too old to serve
+                httpx.post(f"{stub}/faults", json={"error_rate": 0, "slow_rate": 0, "down": False})
+                cities = [f"outage-{i}" for i in range(args.requests)]
+                await drive(client, cities)
+                App.FORECAST_STALE_TTL = -2 * App.FORECAST_UPDATE_INTERVAL
+                httpx.post(f"{stub}/faults", json={"down": True})
+                httpx.post(f"{stub}/stats/reset")
+                results["outage"] = await drive(client, cities)
+                outage_calls = httpx.get(f"{stub}/stats").json()["forecast"]
+                stats = dict(App.upstream_stats["forecast"], **App.upstream_breakers["forecast"].stats,
+                             offline_served=App.forecast_stats["offline_served"])
+            await App.shutdown_event()
+            return results, outage_calls, stats
+
+        report = {}
+        for enabled in (False, True):
+            report[enabled] = asyncio.run(run(enabled))
+
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}, "
+          f"stub latency {args.latency_ms} ms")
+    for name in report[False][0]:
+        for enabled in (False, True):
+            elapsed, latencies, errors = report[enabled][0][name]
+            pct = _percentiles(latencies)
+            print(f"{name:>9}, layer {'on ' if enabled else 'off'}: success {1 - errors / args.requests:6.1%}, "
+                  f"p50 {pct['p50']:7.1f} ms, p99 {pct['p99']:7.1f} ms")
+    for enabled in (False, True):
+        _, calls, stats = report[enabled]
+        print(f"outage, layer {'on ' if enabled else 'off'}: {calls} forecast calls reached the stub; {stats}")
+    # behaviour is covered by tests/test_resilience.py; here only the headline result is enforced
+    if report[True][0]["outage"][2]:
+        sys.exit("with the layer on, every outage request must be answered from the offline fallback")
+
+
+def _process_tree(pid):
+    pids, frontier = [], [pid]
+    while frontier:
+        pid = frontier.pop()
+        pids.append(pid)
+        try:
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    frontier += [int(child) for child in f.read().split()]
+        except FileNotFoundError:
+            pass
+    return pids
+
+
+def _tree_memory_mb(pid):
+    """(processes, summed RSS, summed PSS) of a process and its descendants. PSS splits shared pages
+    between the processes mapping them, so unlike RSS its sum is the real footprint."""
+    rss = pss = 0
+    pids = _process_tree(pid)
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+        except FileNotFoundError:
+            continue
+        rss += int(fields["Rss"].split()[0])
+        pss += int(fields["Pss"].split()[0])
+    return len(pids), rss / 1024, pss / 1024
+
+
+def _settled_memory(pid, timeout=300):
+    """Tree memory once it stops growing, i.e. every worker has loaded its models."""
+    last, deadline = None, time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(1.0)
+        current = _tree_memory_mb(pid)
+        if last is not None and current[0] == last[0] and abs(current[2] - last[2]) < 2:
+            return current
+        last = current
+    return last
+
+
+def _worker_pids(pid):
+    return sorted(p for p in _process_tree(pid) if p != pid)
+
+
+def bench_workers(args):
+    """Memory of N workers: `uvicorn --workers N` (every worker loads its own models) vs serve.py
+    (loaded once before fork), then a reload through serve.py that must replace every worker."""
+    import httpx
+
+    engine_env = {"WEATHER_ML_ENGINE": args.engine, "WEATHER_ADMIN_TOKEN": ADMIN_TOKEN}
+    modes = {
+        "uvicorn": lambda n: ["-m", "uvicorn", "App:app", "--log-level", "warning", "--workers", str(n)],
+        "serve.py": lambda n: ["serve.py", "--workers", str(n)],
+    }
+    body = {"temperature": 10, "wind_speed": 3, "weather_code": 61, "hobbies": "бег, шахматы"}
+    print(f"engine {args.engine}; summed RSS counts shared pages once per process, PSS splits them")
+    for n in args.workers:
+        for mode, command in modes.items():
+            with app_server(args.port, engine_env, command(n)) as (base, pid):
+                procs, rss, pss = _settled_memory(pid)
+                answers = {httpx.post(f"{base}/api/recommend", json=body).text for _ in range(4 * n)}
+            print(f"{n} workers, {mode:>8}: {procs} processes, RSS {rss:8.1f} MB, PSS {pss:8.1f} MB, "
+                  f"{'consistent' if len(answers) == 1 else 'INCONSISTENT'} answers")
+
+    n = max(args.workers)
+    with app_server(args.port, engine_env, modes["serve.py"](n)) as (base, pid):
+        _settled_memory(pid)
+        before = _worker_pids(pid)
+        start = time.perf_counter()
+        response = httpx.post(f"{base}/api/model/reload", headers={"X-Admin-Token": ADMIN_TOKEN})
+        while time.perf_counter() - start < 120:
+            after = _worker_pids(pid)
+            if len(after) == n and not set(after) & set(before):
+                break
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - start
+        errors = sum(httpx.post(f"{base}/api/recommend", json=body).status_code != 200 for _ in range(20))
+    replaced = len(after) == n and not set(after) & set(before)
+    print(f"reload: HTTP {response.status_code}, {n} workers replaced: {replaced} in {elapsed:.1f} s, "
+          f"errors after reload {errors}")
+    if not replaced or errors:
+        sys.exit(1)
+
+
+def _load_tests(args):
+    import httpx
+
+    items = _random_items(args.requests, 2, seed=args.seed)
+    scenarios = {
+        "recommend": [("POST", "/api/recommend", {"temperature": t, "wind_speed": w, "weather_code": c,
+                                                  "hobbies": ", ".join(hs)}) for t, w, c, hs in items],
+        # a fixed set of cities, warmed up first: the cached path
+        "weather_cached": [f"/api/weather?city=city{i % args.cities}&days=3&advice=true&hobbies=бег,рыбалка"
+                           for i in range(args.requests)],
+        # a new city every request: geocode and forecast both go upstream
+        "weather_cold": [f"/api/weather?city=cold{i}&days=3" for i in range(args.requests)],
+    }
+    env = {"WEATHER_ML_ENGINE": args.engine, "WEATHER_INFERENCE_EXECUTOR": args.executor}
+    results = {}
+    with stub_upstream(args.port, args.latency_ms), app_server(args.port + 1, env) as (base, pid):
+        async def run(requests):
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+                await _drive(client, requests[:args.concurrency], args.concurrency)  # warm up
+                if requests is scenarios["weather_cached"]:
+                    await _drive(client, requests[:args.cities], args.concurrency)
+                return await _drive(client, requests, args.concurrency)
+
+        for name, requests in scenarios.items():
+            elapsed, latencies, errors = asyncio.run(run(requests))
+            rss, peak = _process_memory_mb(pid)
+            pct = _percentiles(latencies)
+            results[name] = {
+                "requests": len(requests), "concurrency": args.concurrency, "errors": errors,
+                "throughput_rps": len(requests) / elapsed,
+                "p50_ms": pct["p50"], "p95_ms": pct["p95"], "p99_ms": pct["p99"],
+                "rss_mb": rss, "peak_rss_mb": peak,
+            }
+    return results
+
+
+def bench_suite(args):
+    """Micro-benchmarks and end-to-end load tests, written to a JSON file for comparing commits."""
+    import platform
+
+    if not generate_data.dataset_exists():
+        generate_data.generate_datasets()
+    commit, dirty = _git_revision()
+    report = {"meta": {
+        "commit": commit, "dirty": dirty, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("func", "command")},
+    }}
+    if "micro" in args.parts:
+        report["micro"] = _micro_benchmarks(args)
+        for name, r in report["micro"].items():
+            value = f"{r['median_us']:10.1f} us" if "median_us" in r else f"{r['median_s']:10.2f} s "
+            print(f"{name:>26}: {value}")
+    if "load" in args.parts:
+        report["load"] = _load_tests(args)
+        for name, r in report["load"].items():
+            print(f"{name:>26}: {r['throughput_rps']:8.1f} req/s, p50 {r['p50_ms']:7.1f} ms, "
+                  f"p95 {r['p95_ms']:7.1f} ms, p99 {r['p99_ms']:7.1f} ms, RSS {r['rss_mb']:6.1f} MB, "
+                  f"errors {r['errors']}")
+
+    output = args.output or os.path.join("benchmark-results", f"{commit or 'local'}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+
+def _flatten(report):
+    return {f"{section}.{name}.{key}": value
+            for section in ("micro", "load") for name, r in report.get(section, {}).items()
+            for key, value in r.items()}
+
+
+def bench_compare(args):
+    """Compares two suite result files; exits non-zero when a metric regressed by more than --threshold."""
+    with open(args.baseline) as f:
+        baseline = _flatten(json.load(f))
+    with open(args.candidate) as f:
+        candidate = _flatten(json.load(f))
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        if key.endswith(".errors"):
+            worse = new > old
+        elif key.endswith(("_us", "_s", "_ms", "_mb", "_rps")) and old:
+            # throughput: higher is better; times and memory: lower is better
+            change = (new - old) / old * (-1 if key.endswith("_rps") else 1)
+            worse = change > args.threshold
+        else:
+            continue
+        regressions += worse
+        print(f"{'REGRESSION' if worse else '':>10} {key:<45} {old:12.2f} -> {new:12.2f}")
+    if regressions:
+        sys.exit(f"{regressions} metrics regressed by more than {args.threshold:.0%}")
+
+
+def bench_online(args):
+    """Incremental updates: a new HOBBY_CONFIG category and a batch of feedback rows vs a full
+    refit, then a live model swap under load."""
+    import httpx
+    import App
+    import ml_engine
+    from feedback import append_feedback
+    from ml_engine import UnifiedRecommender
+
+    tmp = tempfile.mkdtemp()
+    ml_engine.FEEDBACK_LOG = App.FEEDBACK_LOG = os.path.join(tmp, "feedback.jsonl")
+    base = UnifiedRecommender()
+    base.load_and_train()
+
+    rng = np.random.RandomState(args.seed)
+    weather = np.column_stack([rng.uniform(-35, 42, args.rows).round(1), rng.uniform(0, 30, args.rows).round(1),
+                               rng.choice(generate_data.WEATHER_CODES, args.rows)])
+    old_hobbies = sorted(base.known_hobbies)
+    old_targets = [old_hobbies[i] for i in rng.randint(0, len(old_hobbies), args.rows)]
+    before = base.hobby_ids(weather, old_targets)
+
+    # 1. a new category with new hobbies, no dataset regeneration
+    generate_data.HOBBY_CONFIG["bench_new_category"] = {
+        "hobbies": ["zorbing", "bog snorkelling"],
+        "rules": {"min_temp": 12, "max_temp": 30, "max_wind": 8, "rain_forbids": True, "fog_forbids": True},
+    }
+    try:
+        updated = UnifiedRecommender()
+        start = time.perf_counter()
+        updated.load_and_train()
+        new_category = time.perf_counter() - start
+
+        new_targets = ["zorbing" if i % 2 else "bog snorkelling" for i in range(args.rows)]
+        table = generate_data.build_rule_table()
+        idx = np.array([table["hobbies"].index(h) for h in new_targets])
+        expected = generate_data.hobby_labels(weather[:, 0], weather[:, 1], weather[:, 2], idx, table)
+        agreement = np.mean(updated.hobby_ids(weather, new_targets) == expected)
+        unchanged = np.mean(updated.hobby_ids(weather, old_targets) == before)
+        print(f"new category (2 hobbies): update {new_category:5.2f} s, agreement with its rules {agreement:.2%}, "
+              f"existing hobbies unchanged {unchanged:.2%}")
+
+        # 2. feedback: users report that disc golf in calm +15..+20 C rain is fine (the rules forbid rain)
+        fb = np.random.RandomState(1)
+        rows = [{"temperature": round(float(fb.uniform(15, 20)), 1), "wind_speed": round(float(fb.uniform(0, 5)), 1),
+                 "weather_code": 61, "hobby": "disc golf", "advice_id": 0} for _ in range(args.feedback)]
+        rows += [{"temperature": 22.0, "wind_speed": 1.0, "weather_code": 0, "clothing_id": 2}] * args.feedback
+        append_feedback(ml_engine.FEEDBACK_LOG, rows)
+        probe = np.column_stack([np.linspace(15.2, 19.8, 50), np.full(50, 2.0), np.full(50, 61)])
+        was = np.mean(updated.hobby_ids(probe, ["disc golf"] * 50) == 0)
+        fed = UnifiedRecommender()
+        start = time.perf_counter()
+        fed.load_and_train()
+        feedback_time = time.perf_counter() - start
+        now = np.mean(fed.hobby_ids(probe, ["disc golf"] * 50) == 0)
+        print(f"{len(rows)} feedback rows: update {feedback_time:5.2f} s, disc golf in rain judged fine "
+              f"{was:.0%} -> {now:.0%}, clothing trees {len(fed.clothing_model.estimators_)}")
+
+        start = time.perf_counter()
+        UnifiedRecommender().load_and_train()
+        print(f"reload with the cached update artifact: {time.perf_counter() - start:5.2f} s")
+        if not args.skip_full:
+            full = _timed_subprocess("from ml_engine import recommender; recommender.load_and_train(use_artifact=False)")
+            print(f"full refit for comparison: {full:5.2f} s")
+
+        # 3. live swap while /api/recommend is under load
+        async def run():
+            App.ADMIN_TOKEN = ADMIN_TOKEN
+            App.recommender = base
+            App.inference = App.InferenceExecutor(base, "thread", workers=2)
+            App.inference.start()
+            App.reset_recommend_cache(base)
+            body = [("POST", "/api/recommend", {"temperature": t, "wind_speed": w, "weather_code": c,
+                                                "hobbies": ", ".join(hs)})
+                    for t, w, c, hs in _random_items(args.requests, 2)]
+            transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+                load = asyncio.create_task(_drive(client, body, args.concurrency))
+                await asyncio.sleep(0.2)
+                reload = await client.post("/api/model/reload", headers={"X-Admin-Token": ADMIN_TOKEN})
+                _, latencies, errors = await load
+                advice = await client.post("/api/recommend", json={"temperature": 20, "wind_speed": 2,
+                                                                   "weather_code": 0, "hobbies": "zorbing"})
+            App.inference.shutdown()
+            return reload.json(), len(latencies), errors, "Zorbing" in advice.json()["recommendation"]
+
+        reload, served, errors, knows_new = asyncio.run(run())
+        print(f"swap under load: reload {reload['seconds']:.2f} s, {served} requests served, {errors} errors, "
+              f"new hobby served after swap: {knows_new}")
+    finally:
+        del generate_data.HOBBY_CONFIG["bench_new_category"]
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weather_site backend benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("cold-start", help="startup time with and without the model artifact")
+    p.add_argument("--model-dir", default="models-bench")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_cold_start)
+
+    p = sub.add_parser("datagen", help="dataset generation throughput and label check")
+    p.add_argument("--samples", type=int, default=1_000_000)
+    p.add_argument("--chunk-size", type=int, default=1_000_000)
+    p.add_argument("--check", type=int, default=200_000)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--format", choices=generate_data.DATA_FORMATS, default=generate_data.DATA_FORMAT)
+    p.set_defaults(func=bench_datagen)
+
+    p = sub.add_parser("dataformat", help="CSV vs npy column files: generation, size, load time and memory")
+    p.add_argument("--samples", type=int, default=2_000_000)
+    p.add_argument("--chunk-size", type=int, default=1_000_000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_dataformat)
+
+    p = sub.add_parser("batch", help="batch inference vs per-item loop")
+    p.add_argument("--items", type=int, default=1000)
+    p.add_argument("--hobbies", type=int, default=3)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("engines", help="forest vs compiled rules latency and disagreement")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--batch", type=int, default=10000)
+    p.add_argument("--samples", type=int, default=20000)
+    p.set_defaults(func=bench_engines)
+
+    p = sub.add_parser("pool", help="/api/weather with and without upstream connection reuse")
+    p.add_argument("--requests", type=int, default=500)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--cities", type=int, default=50)
+    p.add_argument("--keepalive", type=int, default=20)
+    p.add_argument("--latency-ms", type=float, default=0)
+    p.add_argument("--port", type=int, default=8081)
+    p.set_defaults(func=bench_pool)
+
+    p = sub.add_parser("coalescing", help="upstream calls for a cold burst with and without single-flight")
+    p.add_argument("--requests", type=int, default=500)
+    p.add_argument("--cities", type=int, default=5)
+    p.add_argument("--latency-ms", type=float, default=50)
+    p.add_argument("--port", type=int, default=8081)
+    p.set_defaults(func=bench_coalescing)
+
+    p = sub.add_parser("inference", help="event-loop lag and throughput per inference executor")
+    p.add_argument("--requests", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--hobbies", type=int, default=2)
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--window-ms", type=float, default=2)
+    p.add_argument("--kinds", nargs="+", default=["inline", "thread", "process"])
+    p.set_defaults(func=bench_inference)
+
+    p = sub.add_parser("flat", help="flattened tree engine vs sklearn forests")
+    p.add_argument("--rows", type=int, default=20000)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--batch", type=int, default=10000)
+    p.add_argument("--min-agreement", type=float, default=0.995)
+    p.set_defaults(func=bench_flat)
+
+    p = sub.add_parser("bulk", help="per-city /api/weather calls vs one bulk NDJSON request")
+    p.add_argument("--cities", type=int, default=1000)
+    p.add_argument("--days", type=int, default=3)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--latency-ms", type=float, default=20)
+    p.add_argument("--port", type=int, default=8081)
+    p.set_defaults(func=bench_bulk)
+
+    p = sub.add_parser("metrics", help="/metrics after known requests and the observation cost")
+    p.add_argument("--requests", type=int, default=20)
+    p.add_argument("--observations", type=int, default=1_000_000)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser("recommend-cache", help="/api/recommend memo cache: correctness, hit ratio, latency")
+    p.add_argument("--requests", type=int, default=5000)
+    p.add_argument("--probes", type=int, default=200)
+    p.add_argument("--engine", default="forest")
+    p.add_argument("--warm", nargs="*", default=["бег", "велосипед", "бег, велосипед", "рыбалка", ""])
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_recommend_cache)
+
+    p = sub.add_parser("resilience", help="/api/weather under injected upstream faults, layer off vs on")
+    p.add_argument("--requests", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--latency-ms", type=float, default=20)
+    p.add_argument("--error-rate", type=float, default=0.2)
+    p.add_argument("--slow-rate", type=float, default=0.03)
+    p.add_argument("--slow-ms", type=float, default=1000)
+    p.add_argument("--breaker-reset", type=float, default=30)
+    p.add_argument("--port", type=int, default=8083)
+    p.set_defaults(func=bench_resilience)
+
+    p = sub.add_parser("suite", help="micro-benchmarks and load tests, saved as JSON")
+    p.add_argument("--parts", nargs="+", default=["micro", "load"], choices=["micro", "load"])
+    p.add_argument("--engine", default="forest")
+    p.add_argument("--executor", default="thread")
+    p.add_argument("--calls", type=int, default=500)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--skip-train", action="store_true", help="skip the full retrain (~30 s)")
+    p.add_argument("--datagen-samples", type=int, default=1_000_000)
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--cities", type=int, default=50)
+    p.add_argument("--latency-ms", type=float, default=20)
+    p.add_argument("--port", type=int, default=8081, help="stub port; the app listens on port + 1")
+    p.add_argument("--output", help="default: benchmark-results/<commit>.json")
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser("compare", help="compare two suite result files")
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    p.add_argument("--threshold", type=float, default=0.10)
+    p.set_defaults(func=bench_compare)
+
+    p = sub.add_parser("workers", help="memory of N workers with and without preloading before fork")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--engine", default="forest")
+    p.add_argument("--port", type=int, default=8130)
+    p.set_defaults(func=bench_workers)
+
+    p = sub.add_parser("online", help="incremental model updates and a live swap")
+    p.add_argument("--rows", type=int, default=20000)
+    p.add_argument("--feedback", type=int, default=200)
+    p.add_argument("--requests", type=int, default=400)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--seed", type=int, default=3)
+    p.add_argument("--skip-full", action="store_true")
+    p.set_defaults(func=bench_online)
+
+    args = parser.parse_args()
+    os.chdir(BACKEND_DIR)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Small caching primitives for the upstream Open-Meteo calls."""
+from collections import OrderedDict
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU where every entry also expires after its own TTL (seconds)."""
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=MISSING):
+        entry = self._data.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= self.clock():
+            del self._data[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return default
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def peek(self, key, default=MISSING):
+        """Value even if expired, without touching the stats or the LRU order."""
+        entry = self._data.get(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (value, self.clock() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._data.clear()
+
+
+class SqliteCache:
+    """On-disk JSON key/value tier that survives restarts. Expiry uses wall-clock time."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+        )
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        """Returns (value, seconds_left) or MISSING."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        ttl_left = row[1] - time.time() if row else 0
+        if ttl_left <= 0:
+            self.stats["misses"] += 1
+            return MISSING
+        self.stats["hits"] += 1
+        return json.loads(row[0]), ttl_left
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def close(self):
+        self._conn.close()
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight coroutine.
+
+    Every waiter gets the same result or the same exception; nothing is kept after the call
+    finishes, so a failed key is retried by the next caller. A cancelled waiter does not cancel
+    the shared call, and the call is only cancelled by cancel_all().
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._calls = {}
+        self.stats = {"calls": 0, "shared": 0, "errors": 0}
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    async def do(self, key, fn):
+        if not self.enabled:
+            self.stats["calls"] += 1
+            return await fn()
+
+        task = self._calls.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.stats["shared"] += 1
+        # shield: a cancelled caller must not cancel the call the other callers are waiting on
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            # also marks the exception as retrieved when every waiter was cancelled
+            self.stats["errors"] += 1
+
+    def cancel_all(self):
+        for task in list(self._calls.values()):
+            task.cancel()
@@ -0,0 +1,45 @@
+"""Append-only JSON-lines log of user feedback, the input of incremental model updates.
+
+A row is {"temperature", "wind_speed", "weather_code"} plus "clothing_id" (the clothing that
+was right) and/or "hobby" with "advice_id" (the advice that was right for that hobby).
+"""
+import json
+import os
+import threading
+
+FIELDS = ("temperature", "wind_speed", "weather_code", "clothing_id", "hobby", "advice_id")
+
+_lock = threading.Lock()
+
+
+def append_feedback(path, rows):
+    """Appends rows and returns the log size in bytes afterwards."""
+    data = "".join(
+        json.dumps({k: row[k] for k in FIELDS if row.get(k) is not None}, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+    with _lock, open(path, "a", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        return f.tell()
+
+
+def read_feedback(path, size=None):
+    """(rows, bytes_read) for the whole log or its first `size` bytes.
+
+    The log only grows, so a size taken earlier always names the same rows; workers use it to
+    rebuild exactly the models their parent built.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, "rb") as f:
+        data = f.read() if size is None else f.read(size)
+    # a line still being written has no newline yet, it is picked up by the next read
+    end = data.rfind(b"\n") + 1
+    rows = []
+    for line in data[:end].splitlines():
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            print(f"⚠️ [ML] Skipping broken feedback line: {line[:80]!r}")
+    return rows, end
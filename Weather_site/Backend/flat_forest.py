@@ -0,0 +1,184 @@
+"""Random forests exported from sklearn into flat NumPy arrays and evaluated vectorized.
+
+All trees live in one set of node arrays, so a batch of rows walks every tree at once
+with a handful of NumPy operations per tree level instead of sklearn's per-estimator dispatch.
+"""
+import numpy as np
+
+SMALL_BATCH = 4096
+ARRAYS = ("feature", "threshold", "left", "right", "leaf_code", "impure_values", "roots", "classes")
+
+
+def _node_depths(left, right):
+    depth = np.zeros(len(left), dtype=np.int32)
+    frontier, d = np.array([0]), 0
+    while frontier.size:
+        depth[frontier] = d
+        internal = frontier[left[frontier] != -1]
+        frontier = np.concatenate([left[internal], right[internal]])
+        d += 1
+    return depth
+
+
+def _depth_of(left, right, roots):
+    """Longest root-to-leaf path in the flat arrays, where leaves point at themselves."""
+    depth, frontier = 0, np.asarray(roots)
+    while True:
+        internal = frontier[left[frontier] != frontier]
+        if not internal.size:
+            return depth
+        frontier = np.concatenate([left[internal], right[internal]])
+        depth += 1
+
+
+def _round_down_float32(threshold):
+    # sklearn compares float32 inputs with float64 thresholds; for a float32 x,
+    # x <= t holds exactly when x <= (largest float32 not above t)
+    t32 = threshold.astype(np.float32)
+    too_high = t32.astype(np.float64) > threshold
+    t32[too_high] = np.nextafter(t32[too_high], np.float32(-np.inf))
+    return t32
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, leaf_code, impure_values, roots, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # leaf_code >= 0: pure leaf of that class; < 0: row -(code + 1) of impure_values
+        self.leaf_code = leaf_code
+        self.impure_values = impure_values
+        self.roots = roots
+        self.classes = classes
+        self.max_depth = int(_depth_of(left, right, roots))
+
+    @classmethod
+    def from_sklearn(cls, forest, max_trees=None, max_depth=None):
+        """Exports a fitted RandomForestClassifier. Without limits the predictions are identical;
+        max_trees keeps the first trees only, max_depth turns deeper subtrees into leaves."""
+        parts = {k: [] for k in ("feature", "threshold", "left", "right", "leaf_code")}
+        roots, impure, offset, n_impure = [], [], 0, 0
+
+        for estimator in forest.estimators_[:max_trees]:
+            tree = estimator.tree_
+            left, right = tree.children_left, tree.children_right
+            value = tree.value[:, 0, :].astype(np.float64)
+            value /= value.sum(axis=1, keepdims=True)
+
+            keep = np.ones(tree.node_count, dtype=bool)
+            is_leaf = left == -1
+            if max_depth is not None:
+                depth = _node_depths(left, right)
+                keep = depth <= max_depth
+                is_leaf |= depth == max_depth
+
+            nodes = np.flatnonzero(keep)
+            new_index = np.full(tree.node_count, -1, dtype=np.int64)
+            new_index[nodes] = np.arange(len(nodes)) + offset
+            leaf = is_leaf[nodes]
+            self_index = new_index[nodes]
+
+            parts["feature"].append(np.where(leaf, 0, tree.feature[nodes]).astype(np.int8))
+            parts["threshold"].append(np.where(leaf, np.inf, _round_down_float32(tree.threshold[nodes])).astype(np.float32))
+            # leaves point at themselves, so walking past a leaf is a no-op
+            parts["left"].append(np.where(leaf, self_index, new_index[np.maximum(left[nodes], 0)]).astype(np.int32))
+            parts["right"].append(np.where(leaf, self_index, new_index[np.maximum(right[nodes], 0)]).astype(np.int32))
+
+            leaf_values = value[nodes]
+            pure = np.count_nonzero(leaf_values, axis=1) == 1
+            code = np.argmax(leaf_values, axis=1).astype(np.int32)
+            impure_leaves = leaf & ~pure
+            code[impure_leaves] = -(np.arange(impure_leaves.sum(), dtype=np.int32) + n_impure + 1)
+            code[~leaf] = 0
+            parts["leaf_code"].append(code)
+            impure.append(leaf_values[impure_leaves])
+
+            roots.append(offset)
+            offset += len(nodes)
+            n_impure += int(impure_leaves.sum())
+
+        return cls(
+            **{k: np.concatenate(v) for k, v in parts.items()},
+            impure_values=np.concatenate(impure) if impure else np.zeros((0, forest.n_classes_)),
+            roots=np.array(roots, dtype=np.int32),
+            classes=np.asarray(forest.classes_),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**{k: arrays[k] for k in ARRAYS})
+
+    def to_arrays(self):
+        return {k: getattr(self, k) for k in ARRAYS}
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, k).nbytes for k in ARRAYS)
+
+    def leaves(self, X):
+        """Leaf node reached in every tree, shape (n_rows, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        n, n_trees = len(X), len(self.roots)
+        if n * n_trees <= SMALL_BATCH:
+            # few rows: a fixed number of whole-array steps has the least NumPy call overhead
+            rows = np.arange(n)[:, None]
+            node = np.broadcast_to(self.roots, (n, n_trees))
+            for _ in range(self.max_depth):
+                go_left = X[rows, self.feature[node]] <= self.threshold[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+            return node
+
+        # many rows: only keep walking the (row, tree) pairs that have not reached a leaf yet
+        flat_x, n_features = X.ravel(), X.shape[1]
+        node = np.tile(self.roots, n)
+        row = np.repeat(np.arange(n), n_trees)
+        active = np.arange(n * n_trees)
+        while active.size:
+            current = node[active]
+            go_left = flat_x[row[active] * n_features + self.feature[current]] <= self.threshold[current]
+            nxt = np.where(go_left, self.left[current], self.right[current])
+            node[active] = nxt
+            active = active[self.left[nxt] != nxt]
+        return node.reshape(n, n_trees)
+
+    def votes(self, X):
+        """Sum over trees of the leaf class distributions, shape (n_rows, n_classes)."""
+        code = self.leaf_code[self.leaves(X)]
+        n, n_classes = code.shape[0], len(self.classes)
+        pure = code >= 0
+        rows = np.broadcast_to(np.arange(n)[:, None], code.shape)
+        votes = np.bincount(rows[pure] * n_classes + code[pure], minlength=n * n_classes)
+        votes = votes.reshape(n, n_classes).astype(np.float64)
+        if not pure.all():
+            np.add.at(votes, rows[~pure], self.impure_values[-code[~pure] - 1])
+        return votes
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.votes(X), axis=1)]
+
+
+def size_accuracy_report(forest, X, y, tree_counts=(10, 25, 50, 100), depths=(8, 12, 16, 20, None)):
+    """Size and quality of exports with different limits: agreement with the full sklearn forest
+    and accuracy against the true labels y."""
+    reference = forest.predict(X)
+    report = []
+    for trees in tree_counts:
+        for depth in depths:
+            flat = FlatForest.from_sklearn(forest, max_trees=trees, max_depth=depth)
+            pred = flat.predict(X)
+            report.append({
+                "trees": trees, "max_depth": depth, "nodes": flat.node_count, "bytes": flat.nbytes,
+                "agreement": float(np.mean(pred == reference)), "accuracy": float(np.mean(pred == y)),
+            })
+    return report
+
+
+def choose_limits(report, min_agreement=0.995):
+    """Smallest export whose predictions still agree with the full forest often enough."""
+    ok = [r for r in report if r["agreement"] >= min_agreement]
+    return min(ok, key=lambda r: r["bytes"]) if ok else max(report, key=lambda r: r["agreement"])
@@ -1,5 +1,8 @@
 import pandas as pd
 import numpy as np
+import json
+import os
+import shutil
 
 HOBBY_CONFIG = {
     'active_team_sport': {
@@ -192,79 +195,428 @@ HOBBY_CONFIG = {
     }
 }
 
-def generate_datasets():
-    print("🚀 Generating ULTIMATE dataset (100+ hobbies)...")
-    np.random.seed(42)
-    num_samples = 100000
-
-    temps = np.random.uniform(-35, 42, num_samples)
-    winds = np.random.uniform(0, 30, num_samples)
-    weather_codes = np.random.choice([0, 1, 2, 3, 45, 51, 61, 63, 71, 73, 75, 95], num_samples)
-
-    clothing_data = []
-    for t, w, c in zip(temps, winds, weather_codes):
-        feels_like = t - (w * 0.5)
-        choice = 0
-        is_wet = c in [51, 61, 63, 95]
-        
-        if is_wet and t > 10: choice = 5
-        elif feels_like < -20: choice = 4
-        elif feels_like < -5: choice = 4
-        elif feels_like < 5: choice = 3
-        elif feels_like < 15: choice = 2
-        elif feels_like < 25: choice = 1
-        else: choice = 0
-        clothing_data.append([round(t,1), round(w,1), c, choice])
-
-    pd.DataFrame(clothing_data, columns=['temperature', 'wind_speed', 'weather_code', 'clothing_id']).to_csv("dataset.csv", index=False)
-
-    hobby_data = []
-    all_hobbies = []
-    for cat in HOBBY_CONFIG.values():
-        all_hobbies.extend(cat['hobbies'])
-
-    for i in range(num_samples):
-        t = temps[i]
-        w = winds[i]
-        c = weather_codes[i]
-        hobby = np.random.choice(all_hobbies)
-        
-        rules = {}
-        cat_name = ""
-        for name, data in HOBBY_CONFIG.items():
-            if hobby in data['hobbies']:
-                rules = data['rules']
-                cat_name = name
-                break
-        
-        advice_id = 0
-        
-        is_rain = c in [51, 61, 63, 80, 81, 82]
-        is_snow = c in [71, 73, 75, 77, 85, 86]
-        is_storm = c >= 95
-        is_fog = c in [45, 48]
-        is_cloudy = c in [2, 3] 
-        
-        if cat_name == 'indoor_safe':
-            if is_storm: advice_id = 10 
-            else: advice_id = 0 
+WEATHER_CODES = [0, 1, 2, 3, 45, 51, 61, 63, 71, 73, 75, 95]
+WET_CODES = [51, 61, 63, 95]
+RAIN_CODES = [51, 61, 63, 80, 81, 82]
+SNOW_CODES = [71, 73, 75, 77, 85, 86]
+FOG_CODES = [45, 48]
+CLOUDY_CODES = [2, 3]
+
+def _code_mask(codes, size=256):
+    mask = np.zeros(size, dtype=bool)
+    mask[codes] = True
+    return mask
+
+# Boolean lookup tables indexed by WMO weather code: much cheaper than np.isin on small arrays
+WET_MASK, RAIN_MASK, SNOW_MASK, FOG_MASK, CLOUDY_MASK = (
+    _code_mask(c) for c in (WET_CODES, RAIN_CODES, SNOW_CODES, FOG_CODES, CLOUDY_CODES)
+)
+
+
+def _code_flags(codes, mask):
+    return mask[np.clip(np.asarray(codes).astype(np.intp), 0, len(mask) - 1)]
+
+
+DATA_FORMATS = ("npy", "csv")
+DATA_FORMAT = os.environ.get("WEATHER_DATA_FORMAT", "npy")
+DATA_DIR = os.environ.get("WEATHER_DATA_DIR", "training_data")
+CSV_PATHS = ("dataset.csv", "hobbies.csv")
+# "npy" layout: DATA_DIR/<table>/<column>.npy plus the hobby code -> name dictionary
+TABLES = {
+    'clothing': {'temperature': np.float32, 'wind_speed': np.float32, 'weather_code': np.int16,
+                 'clothing_id': np.int8},
+    'hobbies': {'temperature': np.float32, 'wind_speed': np.float32, 'weather_code': np.int16,
+                'hobby': np.int16, 'advice_id': np.int8},
+}
+HOBBY_DICTIONARY = "hobby_names.json"
+
+RULE_DEFAULTS = {'min_temp': -50, 'max_temp': 100, 'max_wind': 99}
+RULE_FLAGS = [
+    'rain_forbids', 'snow_forbids', 'snow_required', 'ice_risk',
+    'fog_forbids', 'clouds_forbids', 'wet_rock_risk'
+]
+
+
+def all_hobbies():
+    return [h for cat in HOBBY_CONFIG.values() for h in cat['hobbies']]
+
+
+def build_rule_table(config=None):
+    """HOBBY_CONFIG flattened into per-hobby arrays, indexed like all_hobbies()."""
+    config = HOBBY_CONFIG if config is None else config
+    hobbies, categories = [], []
+    for cat_name, data in config.items():
+        for hobby in data['hobbies']:
+            hobbies.append(hobby)
+            categories.append(cat_name)
+
+    table = {'hobbies': hobbies, 'categories': categories}
+    table['indoor'] = np.array([c == 'indoor_safe' for c in categories])
+    # per-hobby (rules, indoor) as plain Python values, for table_hobby_rule()
+    table['rows'] = [(config[c]['rules'], c == 'indoor_safe') for c in categories]
+    for key, default in RULE_DEFAULTS.items():
+        table[key] = np.array([config[c]['rules'].get(key, default) for c in categories], dtype=np.float64)
+    for flag in RULE_FLAGS:
+        table[flag] = np.array([config[c]['rules'].get(flag, False) for c in categories])
+    return table
+
+
+def clothing_rule(t, w, c):
+    """Scalar reference of the clothing label; clothing_labels() is the vectorized version."""
+    feels_like = t - (w * 0.5)
+    is_wet = c in WET_CODES
+
+    if is_wet and t > 10: return 5
+    elif feels_like < -20: return 4
+    elif feels_like < -5: return 4
+    elif feels_like < 5: return 3
+    elif feels_like < 15: return 2
+    elif feels_like < 25: return 1
+    else: return 0
+
+
+def hobby_rule(t, w, c, hobby):
+    """Scalar reference of the hobby advice_id; hobby_labels() is the vectorized version."""
+    rules = {}
+    cat_name = ""
+    for name, data in HOBBY_CONFIG.items():
+        if hobby in data['hobbies']:
+            rules = data['rules']
+            cat_name = name
+            break
+    return _apply_rules(t, w, c, rules, cat_name == 'indoor_safe')
+
+
+def table_hobby_rule(t, w, c, table, i):
+    """hobby_rule() for row i of a build_rule_table() table, without scanning HOBBY_CONFIG."""
+    return _apply_rules(t, w, c, *table['rows'][i])
+
+
+def _apply_rules(t, w, c, rules, indoor):
+    is_rain = c in RAIN_CODES
+    is_snow = c in SNOW_CODES
+    is_storm = c >= 95
+    is_fog = c in FOG_CODES
+    is_cloudy = c in CLOUDY_CODES
+
+    if indoor:
+        return 10 if is_storm else 0
+    if is_storm: return 1
+    elif t < rules.get('min_temp', -50): return 2
+    elif t > rules.get('max_temp', 100): return 3
+    elif w > rules.get('max_wind', 99): return 4
+    elif is_rain and rules.get('rain_forbids', False): return 5
+    elif is_snow and rules.get('snow_forbids', False): return 6
+    elif rules.get('snow_required', False) and not is_snow and t > 0: return 7
+    elif rules.get('ice_risk', False) and (t < 2 and (is_rain or is_snow or c<=2)): return 8
+    elif is_fog and rules.get('fog_forbids', False): return 9
+    elif is_cloudy and rules.get('clouds_forbids', False): return 11
+    elif (is_rain or is_fog) and rules.get('wet_rock_risk', False): return 12
+    return 0
+
+
+def clothing_labels(temps, winds, codes):
+    feels_like = temps - winds * 0.5
+    is_wet = _code_flags(codes, WET_MASK)
+    return np.select(
+        [is_wet & (temps > 10), feels_like < -5, feels_like < 5, feels_like < 15, feels_like < 25],
+        [5, 4, 3, 2, 1],
+        default=0,
+    )
+
+
+def hobby_labels(temps, winds, codes, hobby_idx, table=None):
+    """Vectorized advice_id: np.select keeps the if/elif priority order of hobby_rule()."""
+    if table is None:
+        table = build_rule_table()
+
+    def rule(key):
+        return table[key][hobby_idx]
+
+    is_rain = _code_flags(codes, RAIN_MASK)
+    is_snow = _code_flags(codes, SNOW_MASK)
+    is_storm = codes >= 95
+    is_fog = _code_flags(codes, FOG_MASK)
+    is_cloudy = _code_flags(codes, CLOUDY_MASK)
+    indoor = rule('indoor')
+
+    outdoor = np.select(
+        [
+            is_storm,
+            temps < rule('min_temp'),
+            temps > rule('max_temp'),
+            winds > rule('max_wind'),
+            is_rain & rule('rain_forbids'),
+            is_snow & rule('snow_forbids'),
+            rule('snow_required') & ~is_snow & (temps > 0),
+            rule('ice_risk') & (temps < 2) & (is_rain | is_snow | (codes <= 2)),
+            is_fog & rule('fog_forbids'),
+            is_cloudy & rule('clouds_forbids'),
+            (is_rain | is_fog) & rule('wet_rock_risk'),
+        ],
+        [1, 2, 3, 4, 5, 6, 7, 8, 9, 11, 12],
+        default=0,
+    )
+    return np.where(indoor, np.where(is_storm, 10, 0), outdoor)
+
+
+def _sample_weather(rng, n):
+    return rng.uniform(-35, 42, n), rng.uniform(0, 30, n), rng.choice(WEATHER_CODES, n)
+
+
+def sample_clothing(num_samples, seed=0):
+    """Fresh rule-labelled clothing rows in memory, drawn like generate_datasets(): (X, y)."""
+    temps, winds, codes = _sample_weather(np.random.RandomState(seed), num_samples)
+    X = np.column_stack([np.round(temps, 1), np.round(winds, 1), codes])
+    return X, clothing_labels(temps, winds, codes)
+
+
+def sample_hobbies(hobbies, num_samples, seed=0, config=None):
+    """Fresh rule-labelled rows for a few hobbies only: (X, y), where the last column of X is
+    the position of the hobby in `hobbies`."""
+    table = build_rule_table(config)
+    index = {h: i for i, h in enumerate(table['hobbies'])}
+    rng = np.random.RandomState(seed)
+    temps, winds, codes = _sample_weather(rng, num_samples)
+    local = rng.randint(0, len(hobbies), num_samples)
+    hobby_idx = np.array([index[h] for h in hobbies])[local]
+    X = np.column_stack([np.round(temps, 1), np.round(winds, 1), codes, local])
+    return X, hobby_labels(temps, winds, codes, hobby_idx, table)
+
+
+def dataset_files(data_format=None, data_dir=None, clothing_path=CSV_PATHS[0], hobby_path=CSV_PATHS[1]):
+    """Files that make up the training data in the given format."""
+    if (data_format or DATA_FORMAT) == "csv":
+        return [clothing_path, hobby_path]
+    data_dir = data_dir or DATA_DIR
+    return [os.path.join(data_dir, name, f"{column}.npy") for name, columns in TABLES.items() for column in columns] \
+        + [os.path.join(data_dir, HOBBY_DICTIONARY)]
+
+
+def dataset_exists(data_format=None, data_dir=None):
+    return all(os.path.exists(path) for path in dataset_files(data_format, data_dir))
+
+
+def _open_columns(data_dir, num_rows):
+    """Preallocated .npy column files, filled chunk by chunk through memory maps."""
+    columns = {}
+    for name, dtypes in TABLES.items():
+        os.makedirs(os.path.join(data_dir, name), exist_ok=True)
+        columns[name] = {
+            column: np.lib.format.open_memmap(os.path.join(data_dir, name, f"{column}.npy"), mode="w+",
+                                              dtype=dtype, shape=(num_rows,))
+            for column, dtype in dtypes.items()
+        }
+    return columns
+
+
+def _publish_columns(columns, tmp_dir, data_dir, hobby_names):
+    for table in columns.values():
+        for array in table.values():
+            array.flush()
+    with open(os.path.join(tmp_dir, HOBBY_DICTIONARY), "w", encoding="utf-8") as f:
+        json.dump({"hobbies": list(hobby_names)}, f, ensure_ascii=False)
+    # renamed into place, so a reader never sees a half-written dataset
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.replace(tmp_dir, data_dir)
+
+
+def generate_datasets(num_samples=100000, seed=42, chunk_size=1_000_000,
+                      clothing_path="dataset.csv", hobby_path="hobbies.csv", data_format=None, data_dir=None):
+    """Streams both datasets to disk chunk by chunk, so memory stays flat at any num_samples.
+
+    data_format "npy" (the default, WEATHER_DATA_FORMAT) writes typed column files to data_dir,
+    with hobbies as int16 codes into a sorted name dictionary; "csv" writes the two CSV files.
+    For num_samples <= chunk_size the CSV output is identical to the original loop-based generator
+    with the same seed; larger runs draw chunk after chunk from the same RandomState.
+    """
+    data_format = data_format or DATA_FORMAT
+    if data_format not in DATA_FORMATS:
+        raise ValueError(f"Unknown data format {data_format!r}, expected one of {DATA_FORMATS}")
+    print(f"🚀 Generating ULTIMATE dataset (100+ hobbies, {num_samples} samples)...")
+    rng = np.random.RandomState(seed)
+    table = build_rule_table()
+    hobby_names = np.array(table['hobbies'], dtype=object)
+
+    if data_format == "npy":
+        data_dir = data_dir or DATA_DIR
+        dictionary = sorted(set(table['hobbies']))
+        # codes follow the sorted dictionary, the same order LabelEncoder would give
+        hobby_codes = np.array([dictionary.index(h) for h in table['hobbies']], dtype=np.int16)
+        tmp_dir = f"{data_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        columns = _open_columns(tmp_dir, num_samples)
+
+    written = 0
+    while written < num_samples:
+        n = min(chunk_size, num_samples - written)
+        temps, winds, weather_codes = _sample_weather(rng, n)
+        hobby_idx = rng.randint(0, len(hobby_names), n)
+
+        first = written == 0
+        mode = 'w' if first else 'a'
+        t_out, w_out = np.round(temps, 1), np.round(winds, 1)
+        clothing = clothing_labels(temps, winds, weather_codes)
+        advice = hobby_labels(temps, winds, weather_codes, hobby_idx, table)
+
+        if data_format == "npy":
+            rows = slice(written, written + n)
+            for name in TABLES:
+                columns[name]['temperature'][rows] = t_out
+                columns[name]['wind_speed'][rows] = w_out
+                columns[name]['weather_code'][rows] = weather_codes
+            columns['clothing']['clothing_id'][rows] = clothing
+            columns['hobbies']['hobby'][rows] = hobby_codes[hobby_idx]
+            columns['hobbies']['advice_id'][rows] = advice
         else:
-            if is_storm: advice_id = 1
-            elif t < rules.get('min_temp', -50): advice_id = 2
-            elif t > rules.get('max_temp', 100): advice_id = 3
-            elif w > rules.get('max_wind', 99): advice_id = 4
-            elif is_rain and rules.get('rain_forbids', False): advice_id = 5
-            elif is_snow and rules.get('snow_forbids', False): advice_id = 6
-            elif rules.get('snow_required', False) and not is_snow and t > 0: advice_id = 7
-            elif rules.get('ice_risk', False) and (t < 2 and (is_rain or is_snow or c<=2)): advice_id = 8
-            elif is_fog and rules.get('fog_forbids', False): advice_id = 9
-            elif is_cloudy and rules.get('clouds_forbids', False): advice_id = 11
-            elif (is_rain or is_fog) and rules.get('wet_rock_risk', False): advice_id = 12
-
-        hobby_data.append([round(t,1), round(w,1), c, hobby, advice_id])
-
-    pd.DataFrame(hobby_data, columns=['temperature', 'wind_speed', 'weather_code', 'hobby', 'advice_id']).to_csv("hobbies.csv", index=False)
-    print(f"✅ Generated {len(hobby_data)} samples. Knowledge base: {len(all_hobbies)} hobbies.")
+            pd.DataFrame({
+                'temperature': t_out, 'wind_speed': w_out, 'weather_code': weather_codes,
+                'clothing_id': clothing,
+            }).to_csv(clothing_path, index=False, mode=mode, header=first)
+
+            pd.DataFrame({
+                'temperature': t_out, 'wind_speed': w_out, 'weather_code': weather_codes,
+                'hobby': hobby_names[hobby_idx],
+                'advice_id': advice,
+            }).to_csv(hobby_path, index=False, mode=mode, header=first)
+
+        written += n
+
+    if data_format == "npy":
+        _publish_columns(columns, tmp_dir, data_dir, dictionary)
+    print(f"✅ Generated {written} samples. Knowledge base: {len(hobby_names)} hobbies.")
+
+
+def _feature_matrix(*columns):
+    # filled column by column: no float64 intermediate, and float32 is what the trees use anyway
+    X = np.empty((len(columns[0]), len(columns)), dtype=np.float32)
+    for i, column in enumerate(columns):
+        X[:, i] = column
+    return X
+
+
+def load_columns(data_dir=None):
+    """The column files memory-mapped read-only, plus the hobby name dictionary."""
+    data_dir = data_dir or DATA_DIR
+    columns = {
+        name: {column: np.load(os.path.join(data_dir, name, f"{column}.npy"), mmap_mode="r") for column in dtypes}
+        for name, dtypes in TABLES.items()
+    }
+    with open(os.path.join(data_dir, HOBBY_DICTIONARY), encoding="utf-8") as f:
+        return columns, json.load(f)["hobbies"]
+
+
+def load_training_data(data_format=None, data_dir=None, clothing_path=CSV_PATHS[0], hobby_path=CSV_PATHS[1]):
+    """(clothing_X, clothing_y, hobby_X, hobby_y, hobby_names): float32 feature matrices, where the
+    last hobby column is the code of the hobby in hobby_names, sorted like LabelEncoder.classes_."""
+    if (data_format or DATA_FORMAT) == "csv":
+        df_c = pd.read_csv(clothing_path)
+        df_h = pd.read_csv(hobby_path)
+        hobby = pd.Categorical(df_h['hobby'])
+        return (
+            df_c[['temperature', 'wind_speed', 'weather_code']].to_numpy(np.float32), df_c['clothing_id'].to_numpy(),
+            _feature_matrix(df_h['temperature'], df_h['wind_speed'], df_h['weather_code'], hobby.codes),
+            df_h['advice_id'].to_numpy(), list(hobby.categories),
+        )
+
+    columns, names = load_columns(data_dir)
+    c, h = columns['clothing'], columns['hobbies']
+    codes = h['hobby']
+    # hobbies the data never uses are dropped, so every known hobby was trained on
+    used = np.flatnonzero(np.bincount(codes, minlength=len(names)))
+    if len(used) < len(names):
+        remap = np.zeros(len(names), dtype=np.int16)
+        remap[used] = np.arange(len(used))
+        codes, names = remap[codes], [names[i] for i in used]
+    return (
+        _feature_matrix(c['temperature'], c['wind_speed'], c['weather_code']), np.asarray(c['clothing_id']),
+        _feature_matrix(h['temperature'], h['wind_speed'], h['weather_code'], codes), np.asarray(h['advice_id']),
+        names,
+    )
+
+
+def export_csv(data_dir=None, clothing_path=CSV_PATHS[0], hobby_path=CSV_PATHS[1], chunk_size=1_000_000):
+    """Writes the column files back out as dataset.csv / hobbies.csv."""
+    columns, names = load_columns(data_dir)
+    names = np.array(names, dtype=object)
+    for name, path in (('clothing', clothing_path), ('hobbies', hobby_path)):
+        table = columns[name]
+        total = len(table['temperature'])
+        for start in range(0, max(total, 1), chunk_size):
+            rows = slice(start, start + chunk_size)
+            frame = {
+                # float32 -> float64 and back to one decimal, so 12.3 is written as 12.3
+                'temperature': np.round(table['temperature'][rows].astype(np.float64), 1),
+                'wind_speed': np.round(table['wind_speed'][rows].astype(np.float64), 1),
+                'weather_code': table['weather_code'][rows].astype(np.int64),
+            }
+            if name == 'clothing':
+                frame['clothing_id'] = table['clothing_id'][rows].astype(np.int64)
+            else:
+                frame['hobby'] = names[table['hobby'][rows]]
+                frame['advice_id'] = table['advice_id'][rows].astype(np.int64)
+            pd.DataFrame(frame).to_csv(path, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+    print(f"📤 Exported {data_dir or DATA_DIR} to {clothing_path} and {hobby_path}")
+
+
+def import_csv(clothing_path=CSV_PATHS[0], hobby_path=CSV_PATHS[1], data_dir=None, chunk_size=1_000_000):
+    """Converts dataset.csv / hobbies.csv into column files, streaming through both CSVs."""
+    data_dir = data_dir or DATA_DIR
+
+    def count_rows(path):
+        with open(path, "rb") as f:
+            return sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b"")) - 1
+
+    # the two CSVs may differ in length, each table gets its own row count
+    tmp_dir = f"{data_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    columns = {}
+    for name, path in (('clothing', clothing_path), ('hobbies', hobby_path)):
+        n = count_rows(path)
+        os.makedirs(os.path.join(tmp_dir, name))
+        columns[name] = {
+            column: np.lib.format.open_memmap(os.path.join(tmp_dir, name, f"{column}.npy"), mode="w+",
+                                              dtype=dtype, shape=(n,))
+            for column, dtype in TABLES[name].items()
+        }
+
+    first_seen = {}
+    for name, path in (('clothing', clothing_path), ('hobbies', hobby_path)):
+        start = 0
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            rows = slice(start, start + len(chunk))
+            for column in TABLES[name]:
+                if column == 'hobby':
+                    codes = [first_seen.setdefault(h, len(first_seen)) for h in chunk['hobby']]
+                    columns[name]['hobby'][rows] = codes
+                else:
+                    columns[name][column][rows] = chunk[column].to_numpy()
+            start += len(chunk)
+
+    # codes were handed out in order of appearance; renumber them into the sorted dictionary
+    names = sorted(first_seen)
+    remap = np.zeros(len(first_seen), dtype=np.int16)
+    remap[[first_seen[h] for h in names]] = np.arange(len(names))
+    hobby = columns['hobbies']['hobby']
+    for start in range(0, len(hobby), chunk_size):
+        hobby[start:start + chunk_size] = remap[hobby[start:start + chunk_size]]
+    _publish_columns(columns, tmp_dir, data_dir, names)
+    print(f"📥 Imported {clothing_path} and {hobby_path} into {data_dir} ({len(names)} hobbies)")
+
 
 if __name__ == "__main__":
-    generate_datasets()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate the training data (column files or CSV)")
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=DATA_FORMATS, default=DATA_FORMAT)
+    parser.add_argument("--import-csv", action="store_true", help="convert dataset.csv/hobbies.csv to column files")
+    parser.add_argument("--export-csv", action="store_true", help="write the column files out as CSV")
+    args = parser.parse_args()
+    if args.import_csv:
+        import_csv(chunk_size=args.chunk_size)
+    elif args.export_csv:
+        export_csv(chunk_size=args.chunk_size)
+    else:
+        generate_datasets(args.samples, seed=args.seed, chunk_size=args.chunk_size, data_format=args.format)
@@ -0,0 +1,236 @@
+"""Workloads shared by tests/ and benchmark.py, so the benchmarks do not import the test suite.
+
+The App runs wired to the in-process Open-Meteo stub: requests go through ASGI transports, no sockets.
+"""
+import asyncio
+import contextlib
+import time
+
+import httpx
+import numpy as np
+
+import generate_data
+import ml_engine
+import stub_upstream
+
+
+def label_mismatches(n, seed=42):
+    """Rows where the vectorized labels differ from the scalar reference rules."""
+    rng = np.random.RandomState(seed)
+    temps = rng.uniform(-35, 42, n)
+    winds = rng.uniform(0, 30, n)
+    codes = rng.choice(generate_data.WEATHER_CODES, n)
+    hobbies = generate_data.all_hobbies()
+    hobby_idx = rng.randint(0, len(hobbies), n)
+
+    clothing = generate_data.clothing_labels(temps, winds, codes)
+    advice = generate_data.hobby_labels(temps, winds, codes, hobby_idx)
+    expected_clothing = [generate_data.clothing_rule(t, w, c) for t, w, c in zip(temps, winds, codes)]
+    expected_advice = [generate_data.hobby_rule(t, w, c, hobbies[h])
+                       for t, w, c, h in zip(temps, winds, codes, hobby_idx)]
+    return int((clothing != expected_clothing).sum() + (advice != expected_advice).sum())
+
+# upstream host that refuses connections, for transport-error paths
+UNREACHABLE = "unreachable.invalid"
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """Sends every upstream request to stub_upstream.app, whatever the host, except UNREACHABLE."""
+
+    def __init__(self):
+        self.asgi = httpx.ASGITransport(app=stub_upstream.app)
+
+    async def handle_async_request(self, request):
+        if request.url.host == UNREACHABLE:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return await self.asgi.handle_async_request(request)
+
+
+_recommenders = {}
+
+
+def use_engine(engine):
+    """Points App at a recommender of that engine, loaded once per test session."""
+    import App
+    import metrics
+
+    if App.recommender.engine == engine:
+        return
+    if engine not in _recommenders:
+        recommender = App.UnifiedRecommender(engine)
+        recommender.load_and_train()
+        recommender.on_stage = metrics.observe_stage
+        _recommenders[engine] = recommender
+    App.recommender = _recommenders[engine]
+    App.inference = App.InferenceExecutor(
+        App.recommender, App.INFERENCE_EXECUTOR, workers=App.INFERENCE_WORKERS,
+        batch_window=App.INFERENCE_BATCH_WINDOW_MS / 1000, max_batch=App.INFERENCE_MAX_BATCH,
+    )
+
+
+def reset_upstream():
+    for counters in (stub_upstream.calls, stub_upstream.injected):
+        for key in counters:
+            counters[key] = 0
+    stub_upstream.faults.update(error_rate=0.0, slow_rate=0.0, slow_ms=0.0, down=False, seed=0)
+    stub_upstream._rng.seed(0)
+
+
+@contextlib.asynccontextmanager
+async def app_client():
+    """Started App (models loaded, caches and circuit breakers empty) and a client for it."""
+    import App
+    from resilience import CircuitBreaker
+
+    reset_upstream()
+    App.geocode_cache.clear()
+    App.forecast_cache.clear()
+    for api in App.upstream_breakers:
+        App.upstream_breakers[api] = CircuitBreaker(App.BREAKER_FAILURES, App.BREAKER_RESET)
+    await App.startup_event()
+    await App.http_client.aclose()
+    App.http_client = httpx.AsyncClient(transport=StubTransport())
+    transport = httpx.ASGITransport(app=App.app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as client:
+            yield App, client
+    finally:
+        await App.shutdown_event()
+        reset_upstream()
+
+
+def scrape(text):
+    """{(name, frozenset(labels)): value} from Prometheus text format."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        pairs = [p.split("=", 1) for p in labels.rstrip("}").split(",") if p]
+        samples[name, frozenset((k, v.strip('"')) for k, v in pairs)] = float(value)
+    return samples
+
+
+def metric_delta(before, after, name, **labels):
+    key = (name, frozenset(labels.items()))
+    return after.get(key, 0) - before.get(key, 0)
+
+
+def metrics_after_requests(requests=20):
+    """(App, before, after): /metrics scraped around a known sequence of requests. Every city is
+    one of 5 known ones, then comes one unknown city and one call to an unreachable forecast API."""
+    use_engine(ml_engine.DEFAULT_ENGINE)
+
+    async def run():
+        async with app_client() as (App, client):
+            before = scrape((await client.get("/metrics")).text)
+            for i in range(requests):
+                await client.get(f"/api/weather?city=city{i % 5}&advice=true&hobbies=бег")
+                await client.post("/api/recommend", json={"temperature": i % 30, "wind_speed": 3,
+                                                           "weather_code": 61, "hobbies": "бег"})
+            await client.get("/api/weather?city=nowhere")
+            # a forecast API that refuses connections: transport errors
+            forecast_url = App.OPEN_METEO_FORECAST_URL
+            App.OPEN_METEO_FORECAST_URL = f"http://{UNREACHABLE}/v1/forecast"
+            App.forecast_cache.clear()
+            try:
+                await client.get("/api/weather?city=city0")
+            finally:
+                App.OPEN_METEO_FORECAST_URL = forecast_url
+            after = scrape((await client.get("/metrics")).text)
+        return App, before, after
+
+    return asyncio.run(run())
+
+
+def recommend_stream(n, seed):
+    """Requests shaped like real traffic: mostly rounded values, a few popular hobby combinations
+    written with aliases, different order and case."""
+    rng = np.random.RandomState(seed)
+    combos = ["", "бег", "велосипед", "бег, велосипед", "Велик,бег", "рыбалка", "футбол", "шахматы",
+              "running, cycling", "йога, бег", "горные лыжи", "прогулка, фото", "теннис, бассейн", "дрон"]
+    weights = 1 / np.arange(1, len(combos) + 1)
+    codes = generate_data.WEATHER_CODES
+    code_weights = np.array([8, 6, 5, 6, 1, 2, 3, 2, 1, 1, 1, 1], dtype=float)[:len(codes)]
+    requests = []
+    for _ in range(n):
+        decimals = rng.choice([0, 1], p=[0.7, 0.3])
+        requests.append({
+            "temperature": round(float(rng.normal(12, 10)), int(decimals)),
+            "wind_speed": round(float(rng.gamma(2, 2)), int(decimals)),
+            "weather_code": int(rng.choice(codes, p=code_weights / code_weights.sum())),
+            "hobbies": combos[rng.choice(len(combos), p=weights / weights.sum())],
+        })
+    return requests
+
+
+def threshold_probes(points, n, seed):
+    """Inputs exactly at, just below and just above model thresholds (as float32 sees them)."""
+    rng = np.random.RandomState(seed)
+    temps, winds = points
+    probes = []
+    for _ in range(n):
+        t = np.float32(temps[rng.randint(len(temps))]) if temps else np.float32(0)
+        w = np.float32(winds[rng.randint(len(winds))]) if winds else np.float32(0)
+        for dt in (-np.inf, None, np.inf):
+            for dw in (-np.inf, None, np.inf):
+                probes.append({
+                    "temperature": float(t if dt is None else np.nextafter(t, np.float32(dt))),
+                    "wind_speed": float(w if dw is None else np.nextafter(w, np.float32(dw))),
+                    "weather_code": int(rng.choice(generate_data.WEATHER_CODES)), "hobbies": "бег, рыбалка",
+                })
+    return probes
+
+
+async def send(client, requests):
+    """(answers, latencies) of /api/recommend for each request body, one after another."""
+    answers, latencies = [], []
+    for body in requests:
+        start = time.perf_counter()
+        answers.append((await client.post("/api/recommend", json=body)).json()["recommendation"])
+        latencies.append(time.perf_counter() - start)
+    return answers, latencies
+
+
+def uncached(App, requests):
+    """The original endpoint: one prediction with the user's hobbies as sent."""
+    results = App.recommender.predict_batch(
+        (r["temperature"], r["wind_speed"], r["weather_code"], App.split_hobbies(r["hobbies"])) for r in requests)
+    return [App.format_recommendation(c, h) for c, h in results]
+
+
+def compare_cached(engine, requests, probes, seed=0, warm=()):
+    """Sends a request stream through the memo cache, then threshold probes, then (after warming
+    the `warm` hobby lists) the stream again, and compares every answer with the uncached path."""
+    use_engine(engine)
+    stream = recommend_stream(requests, seed)
+
+    async def run():
+        async with app_client() as (App, client):
+            cached, latencies = await send(client, stream)
+            stats = dict(App.recommend_cache.stats)
+            probe_bodies = threshold_probes(App.recommend_cache.points or ([], []), probes, seed)
+            probe_answers, _ = await send(client, probe_bodies)
+
+            App.reset_recommend_cache(App.recommender)
+            start = time.perf_counter()
+            await App.warm_recommend_cache(App.recommender, warm)
+            warm_seconds = time.perf_counter() - start
+            warm_entries = len(App.recommend_cache)
+            before = App.recommend_cache.stats["hits"]
+            warm_answers, _ = await send(client, stream)
+            warm_hits = App.recommend_cache.stats["hits"] - before
+        return App, cached, latencies, stats, probe_bodies, probe_answers, warm_seconds, warm_entries, \
+            warm_answers, warm_hits
+
+    (App, cached, latencies, stats, probe_bodies, probe_answers, warm_seconds, warm_entries,
+     warm_answers, warm_hits) = asyncio.run(run())
+    reference = uncached(App, stream)
+    return {
+        "stream": stream, "latencies": latencies, "stats": stats, "probes": len(probe_bodies),
+        "warm_seconds": warm_seconds, "warm_entries": warm_entries, "warm_hits": warm_hits,
+        "mismatches": sum(a != b for a, b in zip(cached, reference))
+        + sum(a != b for a, b in zip(warm_answers, reference)),
+        "probe_mismatches": sum(a != b for a, b in zip(probe_answers, uncached(App, probe_bodies))),
+    }
@@ -0,0 +1,180 @@
+"""Runs recommender inference off the asyncio event loop, micro-batching concurrent requests."""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import contextvars
+import multiprocessing
+import time
+
+EXECUTORS = ("inline", "thread", "process")
+
+_worker_recommender = None
+_worker_timings = []
+
+
+def _init_worker(engine, feedback_size=None):
+    global _worker_recommender
+    from ml_engine import UnifiedRecommender
+    _worker_recommender = UnifiedRecommender(engine)
+    # Loads the saved artifacts that the parent process already trained (flat ones memory-mapped);
+    # feedback_size pins the feedback log to the rows the parent's models were built from
+    _worker_recommender.ensure_ready(feedback_size)
+    _worker_recommender.on_stage = lambda stage, seconds: _worker_timings.append((stage, seconds))
+
+
+def _call_in_worker(method, *args):
+    """Returns the result plus the stage timings recorded meanwhile, replayed in the parent."""
+    result = getattr(_worker_recommender, method)(*args)
+    timings = _worker_timings[:]
+    _worker_timings.clear()
+    return result, timings
+
+
+class InferenceExecutor:
+    """Collects predictions requested within batch_window seconds into one predict_batch call
+    and runs it on a thread pool or a process pool with the models preloaded in every process.
+
+    kind="inline" keeps the old behaviour and predicts directly on the event loop.
+
+    Stage timings of predict_many/predict_grid reach the caller's request (metrics.request_timings);
+    those of a micro-batch shared by several requests belong to none of them.
+    """
+
+    def __init__(self, recommender, kind="thread", workers=2, batch_window=0.002, max_batch=512):
+        if kind not in EXECUTORS:
+            raise ValueError(f"Unknown executor {kind!r}, expected one of {EXECUTORS}")
+        self.recommender = recommender
+        self.kind = kind
+        self.workers = workers
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.stats = {"batches": 0, "items": 0}
+        self._pool = None
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()
+
+    def start(self):
+        if self._pool is not None or self.kind == "inline":
+            return
+        self._pool = self._new_pool(self.recommender)
+
+    def _new_pool(self, recommender):
+        if self.kind == "thread":
+            return ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+        return ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(recommender.engine, recommender.feedback_size),
+        )
+
+    async def swap(self, recommender):
+        """Replaces the recommender without dropping requests: batches already running finish
+        on the old models, the next batch uses the new ones. A process pool is replaced by a new
+        pool whose workers have loaded the new models before it takes any request."""
+        recommender.on_stage = self.recommender.on_stage
+        if self.kind != "process" or self._pool is None:
+            self.recommender = recommender
+            return
+        pool = self._new_pool(recommender)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _call_in_worker, "ensure_ready")
+                               for _ in range(self.workers)))
+        old, self._pool, self.recommender = self._pool, pool, recommender
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for _, fut in self._pending:
+            fut.cancel()
+        self._pending = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def predict(self, temp, wind, code, hobbies=()):
+        """(clothing_text, [(hobby, advice), ...]) for one weather point."""
+        item = (temp, wind, code, list(hobbies))
+        if self.kind == "inline":
+            return (await self.predict_many([item]))[0]
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        fut = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        result = await fut
+        self._observe(start)
+        return result
+
+    async def predict_many(self, items):
+        """One predict_batch call for items that already arrive as a batch."""
+        start = time.perf_counter()
+        result = await self._predict_many(items)
+        self._observe(start)
+        return result
+
+    async def predict_grid(self, temps, winds, codes, hobbies=()):
+        """Every weather point x every hobby, see UnifiedRecommender.predict_grid."""
+        start = time.perf_counter()
+        self.stats["batches"] += 1
+        self.stats["items"] += len(temps)
+        result = await self.call("predict_grid", temps, winds, codes, list(hobbies))
+        self._observe(start)
+        return result
+
+    async def _predict_many(self, items):
+        items = list(items)
+        self.stats["batches"] += 1
+        self.stats["items"] += len(items)
+        return await self.call("predict_batch", items)
+
+    def _observe(self, start):
+        # "inference": what a caller waits for, including the batch window and the pool queue
+        if self.recommender.on_stage is not None:
+            self.recommender.on_stage("inference", time.perf_counter() - start)
+
+    async def call(self, method, *args):
+        if self.kind == "inline":
+            return getattr(self.recommender, method)(*args)
+        self.start()
+        loop = asyncio.get_running_loop()
+        if self.kind == "process":
+            result, timings = await loop.run_in_executor(self._pool, _call_in_worker, method, *args)
+            if self.recommender.on_stage is not None:
+                for stage, seconds in timings:
+                    self.recommender.on_stage(stage, seconds)
+            return result
+        # run_in_executor does not carry contextvars over to the pool thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._pool, context.run, getattr(self.recommender, method), *args)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # not in the context of whichever request happened to open the batch
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch), context=contextvars.Context())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        try:
+            results = await self._predict_many(item for item, _ in batch)
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # unrelated requests share the batch: retry them one by one, so only the bad one fails
+            for item, fut in batch:
+                await self._run_batch([(item, fut)])
+            return
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
@@ -0,0 +1,189 @@
+"""Prometheus text-format metrics for the backend, without a client library dependency.
+
+Instruments are module-level, as in prometheus_client; GET /metrics renders REGISTRY.
+Observations are a dict lookup plus a bisect, cheap enough for the hot path.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+import math
+import threading
+import time
+
+REGISTRY = []
+# seconds; upstream calls land in the upper half, model inference in the lower one
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.append(self)
+
+    def labels(self, *values, **kwargs):
+        key = tuple(str(v) for v in values) or tuple(str(kwargs[k]) for k in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, child in sorted(self._children.items()):
+            lines += child.samples(self.name, self.labelnames, key)
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labelnames, key, suffix=""):
+        return [f"{name}{suffix}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class _CounterValue(_Value):
+    def samples(self, name, labelnames, key, suffix="_total"):
+        return super().samples(name, labelnames, key, suffix)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        # GIL-atomic enough for metrics: a lost increment under a thread race is acceptable
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def samples(self, name, labelnames, key):
+        lines, total = [], 0
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            total += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, [('le', _format_value(bound))])} {total}")
+        labels = _format_labels(labelnames, key)
+        lines += [f"{name}_sum{labels} {_format_value(self.sum)}", f"{name}_count{labels} {total}"]
+        return lines
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+
+class Callback(Metric):
+    """Values read at scrape time from fn() -> {label_values_tuple: value}, e.g. existing stats dicts."""
+
+    def __init__(self, name, documentation, labelnames, fn, type="gauge", registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.type = type
+        self.fn = fn
+
+    def render(self):
+        self._children = {}
+        child_type = _CounterValue if self.type == "counter" else _Value
+        for key, value in self.fn().items():
+            self._children[tuple(str(v) for v in key)] = child = child_type()
+            child.set(value)
+        return super().render()
+
+
+def render(registry=REGISTRY):
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "weather_stage_seconds", "Time spent per processing stage", ["stage"])
+REQUESTS = Counter(
+    "weather_http_requests", "HTTP requests by endpoint, method and status", ["endpoint", "method", "status"])
+REQUEST_SECONDS = Histogram(
+    "weather_http_request_seconds", "HTTP request latency by endpoint", ["endpoint"])
+UPSTREAM_ERRORS = Counter(
+    "weather_upstream_errors", "Failed upstream Open-Meteo calls", ["api", "reason"])
+MODEL_LOAD_SECONDS = Gauge(
+    "weather_model_load_seconds", "Duration of the last model load (artifact or training)", ["engine"])
+MODEL_TRAIN_SECONDS = Gauge(
+    "weather_model_train_seconds", "Duration of the last model training, 0 when loaded from an artifact",
+    ["engine"])
+
+# stage timings of the current request, only collected when the timing header is enabled
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def server_timing(timings, total):
+    """Server-Timing header value: per-stage durations (summed) and the total, in milliseconds."""
+    summed = {}
+    for stage, seconds in timings:
+        summed[stage] = summed.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in summed.items()]
+    return ", ".join(parts + [f"total;dur={total * 1000:.2f}"])
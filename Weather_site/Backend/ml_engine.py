@@ -1,16 +1,126 @@
-import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
+import functools
+import hashlib
+import joblib
+import json
+import math
 import os
+import time
+import zlib
 import generate_data
+from feedback import read_feedback
+from flat_forest import FlatForest
+
+MODEL_DIR = os.environ.get("WEATHER_MODEL_DIR", "models")
+ARTIFACT_VERSION = 3
+ENGINES = ("forest", "rules", "flat")
+DEFAULT_ENGINE = os.environ.get("WEATHER_ML_ENGINE", "forest")
+# Optional export limits for the "flat" engine, see flat_forest.size_accuracy_report
+FLAT_MAX_TREES = int(os.environ["WEATHER_FLAT_MAX_TREES"]) if os.environ.get("WEATHER_FLAT_MAX_TREES") else None
+FLAT_MAX_DEPTH = int(os.environ["WEATHER_FLAT_MAX_DEPTH"]) if os.environ.get("WEATHER_FLAT_MAX_DEPTH") else None
+# Incremental updates, see UnifiedRecommender.apply_updates
+FEEDBACK_LOG = os.environ.get("WEATHER_FEEDBACK_LOG", "feedback.jsonl")
+FEEDBACK_WEIGHT = float(os.environ.get("WEATHER_FEEDBACK_WEIGHT", "20"))
+OVERLAY_TREES = int(os.environ.get("WEATHER_OVERLAY_TREES", "30"))
+OVERLAY_SAMPLES_PER_HOBBY = int(os.environ.get("WEATHER_OVERLAY_SAMPLES_PER_HOBBY", "2000"))
+CLOTHING_EXTRA_TREES = int(os.environ.get("WEATHER_CLOTHING_EXTRA_TREES", "25"))
+CLOTHING_REPLAY_SAMPLES = int(os.environ.get("WEATHER_CLOTHING_REPLAY_SAMPLES", "20000"))
+
+def training_fingerprint(paths=None):
+    """Hash of the training data: changes only when a full retrain is needed. HOBBY_CONFIG edits
+    are picked up incrementally by apply_updates()."""
+    h = hashlib.sha256()
+    paths = generate_data.dataset_files() if paths is None else paths
+    h.update(f"v{ARTIFACT_VERSION}".encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _finite_weather(row):
+    values = [row.get(k) for k in ("temperature", "wind_speed", "weather_code")]
+    return all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in values)
+
+def new_forest():
+    return RandomForestClassifier(n_estimators=100, random_state=42)
+
+
+class HobbyIndex:
+    """Maps free-form user input to a known hobby name, built once per set of known hobbies.
+
+    Exact names and Russian aliases are plain dict lookups. Anything else is a substring match
+    found through a trigram index and ranked deterministically: prefix matches first, then the
+    earliest match position, the shortest name and finally alphabetical order.
+    """
+
+    def __init__(self, known_hobbies, aliases, default='walking', cache_size=4096):
+        self.names = sorted(known_hobbies)
+        self.default = default
+        self.grams = {}
+        for i, name in enumerate(self.names):
+            for gram in self._grams(name, 3) | self._grams(name, 2) | self._grams(name, 1):
+                self.grams.setdefault(gram, set()).add(i)
+
+        self.direct = {name: name for name in self.names}
+        for alias, target in aliases.items():
+            self.direct.setdefault(alias, self.search(target))
+        self.resolve_free = functools.lru_cache(maxsize=cache_size)(self.search)
+
+    @staticmethod
+    def _grams(text, n):
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def search(self, text):
+        if text in self.direct:
+            return self.direct[text]
+        if not text:
+            return self.default
+        postings = [self.grams.get(g, ()) for g in self._grams(text, min(3, len(text)))]
+        candidates = set.intersection(*map(set, postings)) if postings else set()
+        matches = [self.names[i] for i in candidates if text in self.names[i]]
+        if not matches:
+            return self.default
+        return min(matches, key=lambda name: (not name.startswith(text), name.find(text), len(name), name))
+
+    def resolve(self, user_hobby):
+        clean = user_hobby.lower().strip()
+        hit = self.direct.get(clean)
+        return hit if hit is not None else self.resolve_free(clean)
 
 class UnifiedRecommender:
-    def __init__(self):
-        self.clothing_model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.hobby_model = RandomForestClassifier(n_estimators=100, random_state=42)
+    def __init__(self, engine=DEFAULT_ENGINE):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        self.engine = engine
+        # "rules" evaluates HOBBY_CONFIG directly (the rules the forests were trained on), no models needed
+        self.rule_table = generate_data.build_rule_table()
+        self.rule_index = {h: i for i, h in enumerate(self.rule_table['hobbies'])}
+
+        self.clothing_model = new_forest()
+        self.hobby_model = new_forest()
+        self.clothing_flat = None
+        self.hobby_flat = None
         self.hobby_encoder = LabelEncoder()
+        self.hobby_index = None
+        self.hobby_codes = {}
         self.is_trained = False
+        self.train_seconds = 0.0
+        # HOBBY_CONFIG the base models were trained with, and the per-category submodels that
+        # apply_updates() trained on top: category -> {"model", "hobbies", "codes"}
+        self.trained_config = None
+        self.overlays = {}
+        self.overlay_of = {}
+        self.update_id = None
+        self.feedback_size = 0
+        # optional callable(stage, seconds), e.g. metrics.observe_stage; timings of the batch paths
+        self.on_stage = None
         
         self.clothing_labels = {
             0: "Футболка и шорты 👕",
@@ -76,58 +186,479 @@ class UnifiedRecommender:
             'бокс': 'boxing', 'бильярд': 'billiards', 'программирование': 'coding'
         }
 
-    def load_and_train(self):
-        if not os.path.exists("dataset.csv") or not os.path.exists("hobbies.csv"):
+    def load_and_train(self, use_artifact=True, feedback_size=None):
+        """Base models (artifact or full fit), then the incremental updates from HOBBY_CONFIG
+        edits and the feedback log, or its first feedback_size bytes when given."""
+        if not generate_data.dataset_exists():
             generate_data.generate_datasets()
 
+        fingerprint = training_fingerprint() if use_artifact else None
+        self.load_base(fingerprint)
+        feedback, self.feedback_size = read_feedback(FEEDBACK_LOG, feedback_size)
+        self.apply_updates(feedback, fingerprint)
+
+    def load_base(self, fingerprint):
+        if fingerprint is None:
+            self.train()
+            if self.engine == "flat":
+                self.export_flat()
+            return
+
+        if self.engine == "flat" and self.load_flat_artifact(fingerprint):
+            return
+        if not self.load_artifact(fingerprint):
+            self.train()
+            self.save_artifact(fingerprint)
+        if self.engine == "flat":
+            self.export_flat()
+            self.save_flat_artifact(fingerprint)
+
+    def artifact_path(self, fingerprint, kind="recommender"):
+        return os.path.join(MODEL_DIR, f"{kind}-{fingerprint}.joblib")
+
+    def read_artifact(self, fingerprint, kind="recommender"):
+        path = self.artifact_path(fingerprint, kind)
+        if not os.path.exists(path):
+            return None
+        try:
+            # The flat engine's arrays stay memory-mapped, shared via the page cache by every worker.
+            # sklearn trees copy their node arrays on unpickling, so mapping those would gain nothing.
+            artifact = joblib.load(path, mmap_mode="r" if kind == "flat" else None)
+        except Exception as e:
+            print(f"⚠️ [ML] Broken model artifact {path}: {e}")
+            return None
+        if artifact.get("version") != ARTIFACT_VERSION or artifact.get("fingerprint") != fingerprint:
+            return None
+        return artifact
+
+    def write_artifact(self, fingerprint, payload, kind="recommender"):
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        path = self.artifact_path(fingerprint, kind)
+        artifact = dict(payload, version=ARTIFACT_VERSION, fingerprint=fingerprint)
+        # Uncompressed so flat artifacts can be memory-mapped; written to a temp file and renamed
+        # atomically so workers starting in parallel never read a half-written artifact.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        print(f"💾 [ML] Saved models to {path}")
+        self.prune_artifacts(path, fingerprint.split("-")[0])
+
+    def prune_artifacts(self, kept, base):
+        """Deletes the artifacts a new one replaces: those of other training fingerprints than
+        `base`, and other artifacts of the same kind (an older update of the same base models).
+        Processes that still use a deleted file keep its data, on Linux an open mapping stays valid."""
+        kind = os.path.basename(kept).split("-")[0]
+        for name in os.listdir(MODEL_DIR):
+            path = os.path.join(MODEL_DIR, name)
+            if not name.endswith(".joblib") or path == kept:
+                continue
+            other_kind, _, key = name[:-len(".joblib")].partition("-")
+            if other_kind not in ("recommender", "flat", "update"):
+                continue
+            if key.split("-")[0] != base or other_kind == kind:
+                try:
+                    os.remove(path)
+                    print(f"🧹 [ML] Removed stale artifact {path}")
+                except OSError:
+                    pass
+
+    def load_artifact(self, fingerprint):
+        artifact = self.read_artifact(fingerprint)
+        if artifact is None:
+            return False
+
+        self.clothing_model = artifact["clothing_model"]
+        self.hobby_model = artifact["hobby_model"]
+        self.hobby_encoder = artifact["hobby_encoder"]
+        self.trained_config = artifact["hobby_config"]
+        self.set_known_hobbies(artifact["known_hobbies"])
+        self.is_trained = True
+        print(f"📦 [ML] Loaded models {fingerprint} ({len(self.known_hobbies)} hobbies).")
+        return True
+
+    def save_artifact(self, fingerprint):
+        self.write_artifact(fingerprint, {
+            "clothing_model": self.clothing_model,
+            "hobby_model": self.hobby_model,
+            "hobby_encoder": self.hobby_encoder,
+            "known_hobbies": sorted(self.known_hobbies),
+            "hobby_config": self.trained_config,
+        })
+
+    def export_flat(self):
+        """Flattens both forests for the "flat" engine and frees the sklearn models."""
+        self.clothing_flat = FlatForest.from_sklearn(self.clothing_model, FLAT_MAX_TREES, FLAT_MAX_DEPTH)
+        self.hobby_flat = FlatForest.from_sklearn(self.hobby_model, FLAT_MAX_TREES, FLAT_MAX_DEPTH)
+        self.clothing_model = new_forest()
+        self.hobby_model = new_forest()
+        print(f"🌲 [ML] Flattened forests: {(self.clothing_flat.nbytes + self.hobby_flat.nbytes) / 1e6:.1f} MB")
+
+    def load_flat_artifact(self, fingerprint):
+        artifact = self.read_artifact(fingerprint, "flat")
+        if artifact is None or artifact["limits"] != [FLAT_MAX_TREES, FLAT_MAX_DEPTH]:
+            return False
+
+        self.clothing_flat = FlatForest.from_arrays(artifact["clothing_flat"])
+        self.hobby_flat = FlatForest.from_arrays(artifact["hobby_flat"])
+        self.hobby_encoder = artifact["hobby_encoder"]
+        self.trained_config = artifact["hobby_config"]
+        self.set_known_hobbies(artifact["known_hobbies"])
+        self.is_trained = True
+        print(f"📦 [ML] Loaded flat models {fingerprint} ({len(self.known_hobbies)} hobbies).")
+        return True
+
+    def save_flat_artifact(self, fingerprint):
+        self.write_artifact(fingerprint, {
+            "clothing_flat": self.clothing_flat.to_arrays(),
+            "hobby_flat": self.hobby_flat.to_arrays(),
+            "hobby_encoder": self.hobby_encoder,
+            "known_hobbies": sorted(self.known_hobbies),
+            "hobby_config": self.trained_config,
+            "limits": [FLAT_MAX_TREES, FLAT_MAX_DEPTH],
+        }, kind="flat")
+
+    def apply_updates(self, feedback=(), fingerprint=None):
+        """Incremental path instead of regenerating the datasets and refitting both forests.
+
+        HOBBY_CONFIG categories that are new or changed since the base models were trained, and
+        categories with hobby feedback, get their own small forest trained on fresh rule-labelled
+        rows plus the feedback rows (weighted); their hobbies are routed to it instead of the base
+        hobby model. Clothing feedback adds warm-started trees to the clothing forest. The trained
+        update is cached as an artifact keyed by its inputs. The rules engine ignores feedback.
+        """
+        if self.engine == "rules":
+            return
+        config = generate_data.HOBBY_CONFIG
+        category_of = {h: cat for cat, data in config.items() for h in data['hobbies']}
+        trained = self.trained_config or {}
+
+        # /api/feedback validates rows, the log may predate that or be edited by hand
+        feedback = [row for row in feedback if _finite_weather(row)]
+        by_category = {}
+        for row in feedback:
+            if row.get("hobby") is None or row.get("advice_id") not in self.hobby_advice_map:
+                continue
+            hobby = row["hobby"].lower().strip()
+            hobby = hobby if hobby in category_of else self.resolve_hobby(hobby)
+            if hobby in category_of:
+                by_category.setdefault(category_of[hobby], []).append(dict(row, hobby=hobby))
+        clothing_rows = [row for row in feedback if row.get("clothing_id") in self.clothing_labels]
+        categories = sorted({cat for cat, data in config.items() if trained.get(cat) != data} | set(by_category))
+
+        update_id = None
+        artifact = {"overlays": {}, "clothing_model": None}
+        if categories or clothing_rows:
+            update_id = _digest([
+                {cat: config[cat] for cat in categories}, by_category, clothing_rows, FEEDBACK_WEIGHT,
+                OVERLAY_TREES, OVERLAY_SAMPLES_PER_HOBBY, CLOTHING_EXTRA_TREES, CLOTHING_REPLAY_SAMPLES,
+            ])
+            key = f"{fingerprint}-{update_id}" if fingerprint else None
+            cached = self.read_artifact(key, "update") if key else None
+            if cached is not None:
+                artifact = cached
+                print(f"📦 [ML] Loaded update {update_id} ({len(categories)} categories).")
+            else:
+                start = time.perf_counter()
+                for cat in categories:
+                    hobbies = list(config[cat]['hobbies'])
+                    artifact["overlays"][cat] = {
+                        "model": self.train_overlay(cat, hobbies, by_category.get(cat, [])), "hobbies": hobbies,
+                    }
+                if clothing_rows:
+                    artifact["clothing_model"] = self.warm_start_clothing(clothing_rows, fingerprint)
+                self.train_seconds += time.perf_counter() - start
+                print(f"🧩 [ML] Incremental update {update_id}: {len(categories)} categories, "
+                      f"{len(feedback)} feedback rows in {time.perf_counter() - start:.1f} s")
+                if key:
+                    self.write_artifact(key, artifact, kind="update")
+        self.install_update(artifact, update_id)
+
+    def train_overlay(self, category, hobbies, rows):
+        seed = zlib.crc32(category.encode())
+        X, y = generate_data.sample_hobbies(hobbies, OVERLAY_SAMPLES_PER_HOBBY * len(hobbies), seed)
+        weight = np.ones(len(y))
+        if rows:
+            local = {h: i for i, h in enumerate(hobbies)}
+            X = np.vstack([X, [[r["temperature"], r["wind_speed"], r["weather_code"], local[r["hobby"]]] for r in rows]])
+            y = np.concatenate([y, [r["advice_id"] for r in rows]])
+            weight = np.concatenate([weight, np.full(len(rows), FEEDBACK_WEIGHT)])
+        model = RandomForestClassifier(n_estimators=OVERLAY_TREES, random_state=42)
+        model.fit(X, y, sample_weight=weight)
+        return model
+
+    def warm_start_clothing(self, rows, fingerprint):
+        """Clothing forest with CLOTHING_EXTRA_TREES more trees fitted on fresh rows plus the feedback.
+        The replay rows keep every class present: a warm start cannot change the set of classes."""
+        forest = self.clothing_model
+        if not hasattr(forest, "estimators_"):
+            # the flat engine keeps no sklearn forest around; start from the saved one
+            artifact = self.read_artifact(fingerprint) if fingerprint else None
+            if artifact is None:
+                print("⚠️ [ML] No clothing forest to warm-start, clothing feedback ignored")
+                return None
+            forest = artifact["clothing_model"]
+        classes = set(forest.classes_.tolist())
+        rows = [r for r in rows if r["clothing_id"] in classes]
+
+        X, y = generate_data.sample_clothing(CLOTHING_REPLAY_SAMPLES, seed=len(forest.estimators_))
+        weight = np.ones(len(y))
+        if rows:
+            X = np.vstack([X, [[r["temperature"], r["wind_speed"], r["weather_code"]] for r in rows]])
+            y = np.concatenate([y, [r["clothing_id"] for r in rows]])
+            weight = np.concatenate([weight, np.full(len(rows), FEEDBACK_WEIGHT)])
+        forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + CLOTHING_EXTRA_TREES)
+        forest.fit(X, y, sample_weight=weight)
+        return forest
+
+    def install_update(self, artifact, update_id):
+        self.overlays = {}
+        for cat, overlay in artifact["overlays"].items():
+            model = FlatForest.from_sklearn(overlay["model"]) if self.engine == "flat" else overlay["model"]
+            hobbies = list(overlay["hobbies"])
+            self.overlays[cat] = {"model": model, "hobbies": hobbies, "codes": {h: i for i, h in enumerate(hobbies)}}
+        self.overlay_of = {h: cat for cat, overlay in self.overlays.items() for h in overlay["hobbies"]}
+
+        clothing = artifact["clothing_model"]
+        if clothing is not None and self.engine == "flat":
+            # no tree limit here, it would cut off exactly the warm-started trees
+            self.clothing_flat = FlatForest.from_sklearn(clothing, None, FLAT_MAX_DEPTH)
+        elif clothing is not None:
+            self.clothing_model = clothing
+        self.update_id = update_id
+
+        # hobbies dropped from HOBBY_CONFIG are no longer offered
+        in_config = set(generate_data.all_hobbies())
+        self.set_known_hobbies((set(self.hobby_encoder.classes_) & in_config) | set(self.overlay_of))
+
+    def train(self):
         print("🧠 [ML] Training models (Ultimate Edition)...")
+        start = time.perf_counter()
         
-        df_c = pd.read_csv("dataset.csv")
-        self.clothing_model.fit(df_c[['temperature', 'wind_speed', 'weather_code']], df_c['clothing_id'])
-        
-        df_h = pd.read_csv("hobbies.csv")
-        df_h['hobby_enc'] = self.hobby_encoder.fit_transform(df_h['hobby'])
-        
-        self.hobby_model.fit(df_h[['temperature', 'wind_speed', 'weather_code', 'hobby_enc']], df_h['advice_id'])
-        
-        self.known_hobbies = set(self.hobby_encoder.classes_)
+        X_c, y_c, X_h, y_h, hobby_names = generate_data.load_training_data()
+        self.clothing_model.fit(X_c, y_c)
+        del X_c, y_c
+
+        # the data already carries hobby codes in sorted order, exactly what fit_transform would give
+        self.hobby_encoder.classes_ = np.array(hobby_names, dtype=object)
+        self.hobby_model.fit(X_h, y_h)
+        del X_h, y_h
+
+        self.set_known_hobbies(self.hobby_encoder.classes_)
+        # the datasets may predate HOBBY_CONFIG edits: only hobbies present in the data count as trained
+        self.trained_config = json.loads(json.dumps({
+            cat: dict(data, hobbies=[h for h in data['hobbies'] if h in self.known_hobbies])
+            for cat, data in generate_data.HOBBY_CONFIG.items()
+        }))
         self.is_trained = True
+        self.train_seconds = time.perf_counter() - start
         print(f"✅ Trained on {len(self.known_hobbies)} hobbies.")
 
+    def set_known_hobbies(self, hobbies):
+        self.known_hobbies = set(hobbies)
+        self.hobby_index = HobbyIndex(self.known_hobbies, self.ru_to_en)
+        if hasattr(self.hobby_encoder, "classes_"):
+            self.hobby_codes = {h: i for i, h in enumerate(self.hobby_encoder.classes_)}
+
+    def ensure_ready(self, feedback_size=None):
+        if self.engine == "rules":
+            if self.hobby_index is None:
+                self.set_known_hobbies(self.rule_table['hobbies'])
+        elif not self.is_trained:
+            self.load_and_train(feedback_size=feedback_size)
+
+    def clothing_ids(self, weather, engine=None):
+        """Clothing ids for an (n, 3) array of temperature, wind, weather code."""
+        if (engine or self.engine) == "rules":
+            if len(weather) == 1:
+                # numpy call overhead dominates a single query, the scalar rule is ~10x faster
+                return np.array([generate_data.clothing_rule(*weather[0])])
+            return generate_data.clothing_labels(weather[:, 0], weather[:, 1], weather[:, 2])
+        if (engine or self.engine) == "flat":
+            return self.clothing_flat.predict(weather)
+        return self.clothing_model.predict(weather)
+
+    def hobby_ids(self, weather, target_hobbies, engine=None):
+        """Advice ids for an (n, 3) weather array and n already resolved hobby names."""
+        if (engine or self.engine) == "rules":
+            if len(weather) == 1:
+                t, w, c = weather[0]
+                return np.array([generate_data.table_hobby_rule(t, w, c, self.rule_table,
+                                                                self.rule_index[target_hobbies[0]])])
+            idx = np.array([self.rule_index[h] for h in target_hobbies], dtype=np.intp)
+            return generate_data.hobby_labels(weather[:, 0], weather[:, 1], weather[:, 2], idx, self.rule_table)
+        if self.overlay_of:
+            routed = [self.overlay_of.get(h) for h in target_hobbies]
+            if any(routed):
+                return self.routed_hobby_ids(weather, target_hobbies, routed, engine)
+        return self.base_hobby_ids(weather, target_hobbies, engine)
+
+    def base_hobby_ids(self, weather, target_hobbies, engine=None):
+        codes = np.array([self.hobby_codes[h] for h in target_hobbies], dtype=np.float64)
+        if (engine or self.engine) == "flat":
+            return self.hobby_flat.predict(np.column_stack([weather, codes]))
+        return self.hobby_model.predict(np.column_stack([weather, codes]))
+
+    def routed_hobby_ids(self, weather, target_hobbies, routed, engine):
+        """Rows of hobbies with a per-category submodel go to it, the rest to the base model."""
+        ids = np.zeros(len(target_hobbies), dtype=np.int64)
+        groups = {}
+        for i, cat in enumerate(routed):
+            groups.setdefault(cat, []).append(i)
+        for cat, rows in groups.items():
+            targets = [target_hobbies[i] for i in rows]
+            if cat is None:
+                ids[rows] = self.base_hobby_ids(weather[rows], targets, engine)
+                continue
+            overlay = self.overlays[cat]
+            local = np.array([overlay["codes"][h] for h in targets], dtype=np.float64)
+            ids[rows] = overlay["model"].predict(np.column_stack([weather[rows], local]))
+        return ids
+
+    def split_points(self):
+        """Sorted temperature and wind thresholds of every model in use. Inputs with the same
+        neighbouring thresholds take the same path in every tree, so they get the same answer.
+        None for the rules engine, which compares the raw values."""
+        if self.engine == "rules":
+            return None
+        thresholds = ([], [])
+        models = [self.clothing_flat, self.hobby_flat] if self.engine == "flat" else \
+            [self.clothing_model, self.hobby_model]
+        for model in models + [overlay["model"] for overlay in self.overlays.values()]:
+            if isinstance(model, FlatForest):
+                # leaves point at themselves and carry an infinite threshold
+                internal = model.left != np.arange(len(model.left))
+                trees = [(model.feature[internal], model.threshold[internal].astype(np.float64))]
+            else:
+                trees = [(e.tree_.feature, e.tree_.threshold) for e in getattr(model, "estimators_", ())]
+            for feature, threshold in trees:
+                for i in (0, 1):
+                    thresholds[i].append(threshold[feature == i])
+        return tuple(np.unique(np.concatenate(t or [np.empty(0)])).tolist() for t in thresholds)
+
+    def observe(self, stage, start):
+        if self.on_stage is not None:
+            self.on_stage(stage, time.perf_counter() - start)
+
     def predict_clothing(self, temp, wind, code):
-        if not self.is_trained: self.load_and_train()
-        pred = self.clothing_model.predict([[temp, wind, code]])[0]
-        return self.clothing_labels.get(pred, "Одевайся по погоде")
+        self.ensure_ready()
+        pred = self.clothing_ids(np.array([[temp, wind, code]], dtype=np.float64))[0]
+        return self.clothing_text(pred)
+
+    def clothing_text(self, pred_id):
+        return self.clothing_labels.get(pred_id, "Одевайся по погоде")
+
+    def resolve_hobby(self, user_hobby):
+        return self.hobby_index.resolve(user_hobby)
+
+    def has_model_for(self, hobby):
+        """False for a resolved name the models have no code for, e.g. the default hobby after it
+        was removed from HOBBY_CONFIG; such a hobby gets no advice, as in predict_hobby."""
+        if self.engine == "rules":
+            return hobby in self.rule_index
+        return hobby in self.hobby_codes or hobby in self.overlay_of
+
+    def hobby_text(self, pred_id, target_hobby):
+        if pred_id == 0:
+            return f"Для <b>{target_hobby}</b> условия хорошие."
+        return self.hobby_advice_map.get(pred_id, "")
 
     def predict_hobby(self, temp, wind, code, user_hobby):
-        if not self.is_trained: self.load_and_train()
+        self.ensure_ready()
         
-        clean_hobby = user_hobby.lower().strip()
-        target_hobby = self.ru_to_en.get(clean_hobby, clean_hobby)
-
-        if target_hobby not in self.known_hobbies:
-            found = False
-            for en_hobby in self.known_hobbies:
-                if target_hobby in en_hobby:
-                    target_hobby = en_hobby
-                    found = True
-                    break
-            
-            if not found:
-                target_hobby = 'walking' 
+        target_hobby = self.resolve_hobby(user_hobby)
+        if not self.has_model_for(target_hobby):
+            return None
 
         try:
-            hobby_code = self.hobby_encoder.transform([target_hobby])[0]
-            pred_id = self.hobby_model.predict([[temp, wind, code, hobby_code]])[0]
-            
-            advice_text = self.hobby_advice_map.get(pred_id, "")
-            
-            if pred_id == 0:
-                return f"Для <b>{target_hobby}</b> условия хорошие."
-            else:
-                return advice_text
-                
+            pred_id = self.hobby_ids(np.array([[temp, wind, code]], dtype=np.float64), [target_hobby])[0]
+            return self.hobby_text(pred_id, target_hobby)
         except Exception:
             return None
 
+    def predict_batch(self, items):
+        """Advice for many (temp, wind, code, hobbies) items with one predict call per model.
+
+        Returns a list of (clothing_text, [(hobby, advice), ...]) in the order of items.
+        """
+        self.ensure_ready()
+        items = list(items)
+        if not items:
+            return []
+
+        weather = np.array([(t, w, c) for t, w, c, _ in items], dtype=np.float64).reshape(-1, 3)
+        start = time.perf_counter()
+        clothing_ids = self.clothing_ids(weather)
+        self.observe("predict_clothing", start)
+
+        rows, targets = [], []
+        for i, (_, _, _, hobbies) in enumerate(items):
+            for hobby in hobbies:
+                rows.append(i)
+                targets.append(self.resolve_hobby(hobby))
+        known = [k for k, target in enumerate(targets) if self.has_model_for(target)]
+
+        start = time.perf_counter()
+        hobby_ids = [None] * len(targets)
+        if known:
+            predicted = self.hobby_ids(weather[[rows[k] for k in known]], [targets[k] for k in known])
+            for k, pred in zip(known, predicted):
+                hobby_ids[k] = pred
+            self.observe("predict_hobby", start)
+
+        results = [(self.clothing_text(pred), []) for pred in clothing_ids]
+        k = 0
+        for i, (_, _, _, hobbies) in enumerate(items):
+            for hobby in hobbies:
+                advice = self.hobby_text(hobby_ids[k], targets[k]) if hobby_ids[k] is not None else None
+                results[i][1].append((hobby, advice))
+                k += 1
+        return results
+
+    def predict_grid(self, temps, winds, codes, hobbies=()):
+        """Advice for every weather point x every hobby, built as one feature matrix per model.
+
+        Hobbies are resolved once rather than per point. Returns (clothing_texts, hobby_texts),
+        where hobby_texts[i][j] is the advice for point i and hobbies[j].
+        """
+        self.ensure_ready()
+        weather = np.column_stack([
+            np.asarray(temps, dtype=np.float64), np.asarray(winds, dtype=np.float64),
+            np.asarray(codes, dtype=np.float64),
+        ])
+        start = time.perf_counter()
+        clothing = [self.clothing_text(pred) for pred in self.clothing_ids(weather)] if len(weather) else []
+        self.observe("predict_clothing", start)
+        targets = [self.resolve_hobby(h) for h in hobbies]
+        if not targets or not len(weather):
+            return clothing, [[] for _ in clothing]
+
+        n = len(weather)
+        known = [j for j, target in enumerate(targets) if self.has_model_for(target)]
+        texts = [[None] * len(targets) for _ in range(n)]
+        if known:
+            k = len(known)
+            start = time.perf_counter()
+            ids = self.hobby_ids(np.repeat(weather, k, axis=0), [targets[j] for j in known] * n).reshape(n, k)
+            self.observe("predict_hobby", start)
+            for i in range(n):
+                for col, j in enumerate(known):
+                    texts[i][j] = self.hobby_text(ids[i, col], targets[j])
+        return clothing, texts
+
+    def engine_disagreement(self, num_samples=20000, seed=0):
+        """Share of random queries where the trained forests and the compiled rules disagree."""
+        if not self.is_trained: self.load_and_train()
+        learned = "flat" if self.engine == "flat" else "forest"
+        rng = np.random.RandomState(seed)
+        weather = np.column_stack([
+            rng.uniform(-35, 42, num_samples),
+            rng.uniform(0, 30, num_samples),
+            rng.choice(generate_data.WEATHER_CODES, num_samples),
+        ])
+        hobbies = [self.rule_table['hobbies'][i] for i in rng.randint(0, len(self.rule_index), num_samples)]
+
+        clothing = self.clothing_ids(weather, learned) != self.clothing_ids(weather, "rules")
+        hobby = self.hobby_ids(weather, hobbies, learned) != self.hobby_ids(weather, hobbies, "rules")
+        return {"clothing": float(clothing.mean()), "hobby": float(hobby.mean())}
+
 recommender = UnifiedRecommender()
\ No newline at end of file
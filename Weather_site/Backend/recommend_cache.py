@@ -0,0 +1,65 @@
+"""Memoized /api/recommend answers, keyed by what the models can actually tell apart.
+
+Temperature and wind are replaced by the interval between the neighbouring split thresholds of
+every tree (UnifiedRecommender.split_points), so two inputs share an entry only when the models
+are guaranteed to answer them identically. Hobbies are alias-resolved, deduplicated and sorted;
+the entry stores the advice per resolved hobby and the response is rebuilt in the caller's order
+with the caller's spelling.
+"""
+from bisect import bisect_left
+import math
+
+import numpy as np
+
+from cache import TTLCache
+
+
+class RecommendCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.recommender = None
+        self.points = None
+        self.cache = TTLCache(max(maxsize, 1), math.inf)
+        self.stats = self.cache.stats
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    def reset(self, recommender):
+        """Binds the cache to a (new) recommender and drops the answers of the previous one."""
+        self.recommender = recommender
+        self.points = recommender.split_points()
+        self.cache.clear()
+
+    def cell(self, value, points):
+        # the trees compare float32 inputs, so that is the value to place between the thresholds
+        value32 = float(np.float32(value))
+        return bisect_left(points, value32) if math.isfinite(value32) else None
+
+    def key(self, temp, wind, code, hobbies):
+        """(key, resolved hobbies) for one query; the key is None when the query must not be cached."""
+        resolved = [self.recommender.resolve_hobby(h) for h in hobbies]
+        targets = tuple(sorted(set(resolved)))
+        if self.points is None:
+            return (temp, wind, code, targets), resolved
+        temp_cell, wind_cell = self.cell(temp, self.points[0]), self.cell(wind, self.points[1])
+        if temp_cell is None or wind_cell is None:
+            return None, resolved
+        return (temp_cell, wind_cell, code, targets), resolved
+
+    def get(self, key):
+        """(clothing_text, {resolved_hobby: advice}) or MISSING."""
+        return self.cache.get(key)
+
+    def set(self, key, value, recommender):
+        # an answer computed while the models were swapped belongs to the old ones
+        if recommender is self.recommender:
+            self.cache.set(key, value)
+
+    def hit_ratio(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
@@ -0,0 +1,132 @@
+"""Building blocks for calling a flaky upstream: deadlines, jittered backoff, hedging, a circuit breaker.
+
+App.upstream_get combines them for the Open-Meteo calls.
+"""
+from collections import deque
+import asyncio
+import math
+import random
+import time
+
+
+class Deadline:
+    """Time budget of one stage, shared by all attempts of it."""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self.clock())
+
+
+def backoff(attempt, base, cap, rng=random):
+    """"Full jitter" exponential backoff: callers retrying together spread out instead of
+    hitting a recovering upstream in lockstep."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LatencyTracker:
+    """Latencies of the last `window` successful calls; quantile() is recomputed every
+    `refresh` observations rather than sorting on every request."""
+
+    def __init__(self, window=512, refresh=32):
+        self.samples = deque(maxlen=window)
+        self.refresh = refresh
+        self._since = 0
+        self._quantiles = {}
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self._since += 1
+        if self._since >= self.refresh:
+            self._since = 0
+            self._quantiles = {}
+
+    def quantile(self, q, min_samples=20):
+        if len(self.samples) < min_samples:
+            return None
+        value = self._quantiles.get(q)
+        if value is None:
+            ordered = sorted(self.samples)
+            value = self._quantiles[q] = ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+        return value
+
+
+async def hedged(call, delay, stats=None):
+    """Awaits call(); when it has not finished after `delay` seconds a second call() is started
+    and the first one to succeed wins, the other is cancelled. delay=None disables hedging.
+    Only for idempotent requests."""
+    first = asyncio.ensure_future(call())
+    tasks = {first}
+    try:
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            second = asyncio.ensure_future(call())
+            tasks.add(second)
+            if stats is not None:
+                stats["hedges"] += 1
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if stats is not None and task is not first:
+                        stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class CircuitBreaker:
+    """closed: calls pass, `failures` consecutive failures open the circuit. open: calls are
+    rejected without touching the upstream for `reset_after` seconds. half-open: one probe call
+    passes; its success closes the circuit, its failure opens it again."""
+
+    def __init__(self, failures=5, reset_after=30.0, clock=time.monotonic):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.clock = clock
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    def rejecting(self):
+        """True while calls would be rejected, without claiming the half-open probe."""
+        return self.state == "open" and self.clock() - self.opened_at < self.reset_after \
+            or self.state == "half-open"
+
+    def allow(self):
+        if self.state == "open" and self.clock() - self.opened_at >= self.reset_after:
+            self.state = "half-open"
+            self.stats["probes"] += 1
+            return True
+        if self.state == "closed":
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def abandon(self):
+        """The call allowed by allow() ended without an outcome (e.g. it was cancelled): a
+        half-open circuit lets the next call probe instead of staying half-open forever."""
+        if self.state == "half-open":
+            self.state = "open"
+            self.opened_at = self.clock() - self.reset_after
+
+    def success(self):
+        self.state = "closed"
+        self.consecutive = 0
+
+    def failure(self):
+        self.consecutive += 1
+        if self.state == "half-open" or self.consecutive >= self.failures:
+            if self.state != "open":
+                self.stats["opened"] += 1
+            self.state = "open"
+            self.opened_at = self.clock()
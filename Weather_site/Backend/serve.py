@@ -0,0 +1,213 @@
+"""Prefork server: the models are loaded once in the parent, then N uvicorn workers are forked.
+
+`uvicorn --workers N` spawns fresh interpreters that each import ml_engine and load (or train)
+their own copy of both forests. Here the parent builds the recommender before forking, so
+every worker starts with it already in memory and shares its pages copy-on-write; the flat
+engine's arrays are memory-mapped from the artifact on top of that. Total RSS stays close to
+one model set plus a small per-worker overhead.
+
+SIGHUP (or POST /api/model/reload in any worker) rebuilds the models in the parent, forks a
+new generation of workers that inherit them and, once those accept connections, stops the old
+ones gracefully: requests in flight finish on the old models.
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+
+WORKERS = int(os.environ.get("WEATHER_WORKERS", "2"))
+WORKER_READY_TIMEOUT = float(os.environ.get("WEATHER_WORKER_READY_TIMEOUT", "60"))
+
+
+def preload(engine=None):
+    """Builds the recommender the workers will inherit and records its load time."""
+    import ml_engine
+    from metrics import MODEL_LOAD_SECONDS, MODEL_TRAIN_SECONDS
+
+    start = time.perf_counter()
+    recommender = ml_engine.UnifiedRecommender(engine or ml_engine.recommender.engine)
+    recommender.load_and_train()
+    ml_engine.recommender = recommender
+    MODEL_LOAD_SECONDS.labels(recommender.engine).set(time.perf_counter() - start)
+    MODEL_TRAIN_SECONDS.labels(recommender.engine).set(recommender.train_seconds)
+    return recommender
+
+
+class Supervisor:
+    def __init__(self, host, port, workers, log_level="info"):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.log_level = log_level
+        self.generation = {}  # pid -> generation number
+        self.current = 0
+        self.reload_requested = False
+        self.stopping = False
+
+    def bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn(self, ready_fd):
+        pid = os.fork()
+        if pid:
+            self.generation[pid] = self.current
+            return pid
+        # worker
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        code = 0
+        try:
+            self.run_worker(ready_fd)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def run_worker(self, ready_fd):
+        import uvicorn
+
+        # App sends /api/model/reload here instead of rebuilding only its own copy
+        os.environ["WEATHER_SUPERVISOR_PID"] = str(os.getppid())
+        import App
+
+        class Server(uvicorn.Server):
+            async def startup(self, sockets=None):
+                await super().startup(sockets)
+                if self.started:
+                    try:
+                        os.write(ready_fd, b".")
+                    except OSError:
+                        pass  # a replacement worker: nobody is waiting for it
+
+        config = uvicorn.Config(App.app, log_level=self.log_level, lifespan="on")
+        Server(config).run(sockets=[self.sock])
+
+    def start_generation(self):
+        """Forks a full set of workers and waits until they all accept connections."""
+        self.current += 1
+        read_fd, write_fd = os.pipe()
+        # objects that exist now are never collected, so the GC never writes to (and copies) their pages
+        gc.freeze()
+        for _ in range(self.workers):
+            self.spawn(write_fd)
+        os.close(write_fd)
+        ready, deadline = 0, time.monotonic() + WORKER_READY_TIMEOUT
+        while ready < self.workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                break
+            ready += len(os.read(read_fd, self.workers))
+        os.close(read_fd)
+        return ready == self.workers
+
+    def retire(self, generation):
+        for pid, gen in list(self.generation.items()):
+            if gen < generation:
+                self.signal(pid, signal.SIGTERM)
+
+    def signal(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self.generation.pop(pid, None)
+
+    def reap(self):
+        """Collects exited workers and replaces the ones that died unexpectedly."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            gen = self.generation.pop(pid, None)
+            if gen == self.current and not self.stopping:
+                print(f"⚠️ [Serve] Worker {pid} exited ({status}), starting a replacement")
+                read_fd, write_fd = os.pipe()
+                self.spawn(write_fd)
+                os.close(write_fd)
+                os.close(read_fd)
+
+    def reload(self):
+        self.reload_requested = False
+        import ml_engine
+
+        start = time.perf_counter()
+        # the old models become collectable again once the old workers are gone
+        gc.unfreeze()
+        previous = ml_engine.recommender
+        try:
+            recommender = preload(previous.engine)
+        except Exception as e:
+            print(f"⚠️ [Serve] Model reload failed, keeping the current workers: {e}")
+            return
+        if not self.start_generation():
+            print(f"⚠️ [Serve] New workers did not start in {WORKER_READY_TIMEOUT:.0f} s, keeping the old ones")
+            for pid, gen in list(self.generation.items()):
+                if gen == self.current:
+                    self.signal(pid, signal.SIGTERM)
+            self.current -= 1
+            ml_engine.recommender = previous
+            return
+        self.retire(self.current)
+        print(f"🔄 [Serve] Swapped in models (update {recommender.update_id}) on {self.workers} workers "
+              f"in {time.perf_counter() - start:.1f} s")
+
+    def run(self):
+        self.sock = self.bind()
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "reload_requested", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "stopping", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "stopping", True))
+        # wakes the sleep below, so dead workers are reaped promptly
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+
+        start = time.perf_counter()
+        recommender = preload()
+        print(f"📦 [Serve] Models preloaded in {time.perf_counter() - start:.1f} s, "
+              f"starting {self.workers} workers on {self.host}:{self.port}")
+        if not self.start_generation():
+            print("⚠️ [Serve] Not all workers started")
+        print(f"✅ [Serve] {len(self.generation)} workers serving {recommender.engine} models")
+
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload()
+            self.reap()
+            time.sleep(0.2)
+
+        for pid in list(self.generation):
+            self.signal(pid, signal.SIGTERM)
+        while self.generation:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            self.generation.pop(pid, None)
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the backend with N workers sharing one model set")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    # heavy imports in the parent, so their pages are shared by the workers too
+    import fastapi, httpx, pydantic  # noqa: F401,E401
+    Supervisor(args.host, args.port, args.workers, args.log_level).run()
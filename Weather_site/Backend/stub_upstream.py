@@ -0,0 +1,142 @@
+"""Local stand-in for the Open-Meteo geocoding and forecast APIs, for load tests and benchmarks.
+
+    uvicorn stub_upstream:app --port 8081
+    OPEN_METEO_GEOCODE_URL=http://127.0.0.1:8081/v1/search \
+    OPEN_METEO_FORECAST_URL=http://127.0.0.1:8081/v1/forecast uvicorn App:app
+
+Responses are deterministic per city / coordinate. STUB_LATENCY_MS adds an artificial delay.
+
+Faults for resilience tests are set with POST /faults (or STUB_* variables at startup):
+error_rate answers that share of requests with 503, slow_rate delays that share by slow_ms,
+down=true fails every request. Faults are drawn from a seeded RNG, so a run is reproducible.
+"""
+from datetime import date, timedelta
+import asyncio
+import os
+import random
+import zlib
+
+from fastapi import FastAPI, HTTPException
+
+app = FastAPI(title="Open-Meteo stub")
+
+LATENCY = float(os.environ.get("STUB_LATENCY_MS", "0")) / 1000
+UNKNOWN_CITIES = {"nowhere", "atlantis"}
+CODES = [0, 1, 2, 3, 45, 51, 61, 63, 71, 73, 75, 95]
+
+calls = {"geocode": 0, "forecast": 0}
+faults = {
+    "error_rate": float(os.environ.get("STUB_ERROR_RATE", "0")),
+    "slow_rate": float(os.environ.get("STUB_SLOW_RATE", "0")),
+    "slow_ms": float(os.environ.get("STUB_SLOW_MS", "0")),
+    "down": os.environ.get("STUB_DOWN", "0") == "1",
+    "seed": 0,
+}
+injected = {"errors": 0, "slow": 0}
+_rng = random.Random(faults["seed"])
+
+
+def _seed(*parts):
+    return zlib.crc32("|".join(str(p) for p in parts).encode())
+
+
+async def _delay():
+    if faults["down"] or _rng.random() < faults["error_rate"]:
+        injected["errors"] += 1
+        raise HTTPException(status_code=503, detail="Injected failure")
+    if _rng.random() < faults["slow_rate"]:
+        injected["slow"] += 1
+        await asyncio.sleep(faults["slow_ms"] / 1000)
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+
+
+@app.get("/v1/search")
+async def search(name: str, count: int = 1, language: str = "en", format: str = "json"):
+    calls["geocode"] += 1
+    await _delay()
+    if name.strip().lower() in UNKNOWN_CITIES:
+        return {"generationtime_ms": 0.1}
+    seed = _seed(name.strip().lower())
+    return {"results": [{
+        "name": name.strip().title(), "country": "Stubland",
+        "latitude": round((seed % 18000) / 100 - 90, 4),
+        "longitude": round((seed // 18000 % 36000) / 100 - 180, 4),
+    }]}
+
+
+@app.get("/v1/forecast")
+async def forecast(latitude: str, longitude: str, forecast_days: int = 7,
+                   current_weather: bool = True, daily: str = "", hourly: str = "", timezone: str = "auto",
+                   temperature_unit: str = "celsius", windspeed_unit: str = "ms"):
+    """Like Open-Meteo, comma-separated coordinates return a list with one forecast per location."""
+    calls["forecast"] += 1
+    await _delay()
+    lats = [float(v) for v in latitude.split(",")]
+    lons = [float(v) for v in longitude.split(",")]
+    if len(lats) != len(lons):
+        raise HTTPException(status_code=400, detail="latitude and longitude must have the same length")
+    # one bad pair fails the whole call, as upstream
+    if any(not -90 <= lat <= 90 or not -180 <= lon <= 180 for lat, lon in zip(lats, lons)):
+        raise HTTPException(status_code=400, detail="Latitude must be in range of -90 to 90°, longitude -180 to 180°")
+    results = [_forecast(lat, lon, forecast_days, hourly) for lat, lon in zip(lats, lons)]
+    return results if len(results) > 1 else results[0]
+
+
+def _forecast(latitude, longitude, forecast_days, hourly):
+    seed = _seed(round(latitude, 2), round(longitude, 2))
+    base = seed % 60 - 25
+    today = date(2025, 1, 1)
+    days = [today + timedelta(days=i) for i in range(forecast_days)]
+    result = {
+        "latitude": latitude, "longitude": longitude,
+        "current_weather": {
+            "temperature": float(base), "windspeed": float(seed % 20),
+            "weathercode": CODES[seed % len(CODES)], "time": f"{today.isoformat()}T12:00",
+        },
+        "daily": {
+            "time": [d.isoformat() for d in days],
+            "temperature_2m_max": [float(base + 3 + i % 4) for i in range(forecast_days)],
+            "temperature_2m_min": [float(base - 3 - i % 3) for i in range(forecast_days)],
+            "weathercode": [CODES[(seed + i) % len(CODES)] for i in range(forecast_days)],
+            "windspeed_10m_max": [float((seed + 3 * i) % 20) for i in range(forecast_days)],
+        },
+    }
+    if hourly:
+        hours = forecast_days * 24
+        result["hourly"] = {
+            "time": [f"{days[i // 24].isoformat()}T{i % 24:02d}:00" for i in range(hours)],
+            "temperature_2m": [float(base + (i % 24 - 12) / 3) for i in range(hours)],
+            "windspeed_10m": [float((seed + i) % 15) for i in range(hours)],
+            "weathercode": [CODES[(seed + i // 6) % len(CODES)] for i in range(hours)],
+        }
+    return result
+
+
+@app.get("/stats")
+async def stats():
+    return dict(calls, **{f"injected_{k}": v for k, v in injected.items()})
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    for counters in (calls, injected):
+        for key in counters:
+            counters[key] = 0
+    return calls
+
+
+@app.get("/faults")
+async def get_faults():
+    return faults
+
+
+@app.post("/faults")
+async def set_faults(changes: dict):
+    """Updates the given fault settings (the rest stay) and restarts the fault RNG from the seed."""
+    unknown = set(changes) - set(faults)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fault settings: {sorted(unknown)}")
+    faults.update(changes)
+    _rng.seed(faults["seed"])
+    return faults
@@ -0,0 +1,18 @@
+import os
+
+import joblib
+
+import ml_engine
+
+
+def test_writing_an_artifact_prunes_the_ones_it_replaces(tmp_path, monkeypatch):
+    monkeypatch.setattr(ml_engine, "MODEL_DIR", str(tmp_path))
+    for name in ("recommender-old", "flat-old", "update-old-1", "recommender-new", "flat-new", "update-new-1"):
+        joblib.dump({}, tmp_path / f"{name}.joblib")
+    (tmp_path / "notes.txt").write_text("kept")
+    recommender = ml_engine.UnifiedRecommender("flat")
+
+    recommender.write_artifact("new-2", {"weights": [1]}, kind="update")
+    assert sorted(os.listdir(tmp_path)) == ["flat-new.joblib", "notes.txt", "recommender-new.joblib",
+                                            "update-new-2.joblib"]
+    assert recommender.read_artifact("new-2", kind="update")["weights"] == [1]
@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+import pytest
+
+import ml_engine
+from feedback import append_feedback
+
+
+@pytest.fixture
+def feedback_client(tmp_path, monkeypatch):
+    import App
+
+    monkeypatch.setattr(App, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(App, "FEEDBACK_LOG", str(tmp_path / "feedback.jsonl"))
+
+    def post(body, token="secret"):
+        async def run():
+            transport = httpx.ASGITransport(app=App.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+                return await client.post("/api/feedback", content=body, headers={
+                    "X-Admin-Token": token, "Content-Type": "application/json"})
+        return asyncio.run(run())
+
+    return post
+
+
+ROW = '{"temperature": %s, "wind_speed": %s, "weather_code": 61, "hobby": "running", "advice_id": %s}'
+
+
+@pytest.mark.parametrize("temperature, wind, advice", [
+    ("Infinity", "1", "2"), ("NaN", "1", "2"), ("20", "-Infinity", "2"), ("1e9", "1", "2"), ("20", "500", "2"),
+    ("20", "1", "99"),
+])
+def test_feedback_rejects_invalid_rows(feedback_client, temperature, wind, advice):
+    resp = feedback_client('{"items": [%s]}' % (ROW % (temperature, wind, advice)))
+    assert resp.status_code in (400, 422)
+
+
+def test_feedback_needs_the_admin_token(feedback_client):
+    body = '{"items": [%s]}' % (ROW % ("20", "1", "2"))
+    assert feedback_client(body, token="wrong").status_code == 401
+    assert feedback_client(body).status_code == 200
+
+
+def test_updates_skip_rows_without_finite_weather(tmp_path, monkeypatch):
+    log = str(tmp_path / "feedback.jsonl")
+    monkeypatch.setattr(ml_engine, "FEEDBACK_LOG", log)
+    with open(log, "w") as f:
+        f.write(ROW % ("Infinity", "1", "2") + "\n")
+        f.write('{"wind_speed": 1, "weather_code": 0, "clothing_id": 2}\n')
+    append_feedback(log, [{"temperature": float("nan"), "wind_speed": 1.0, "weather_code": 0, "clothing_id": 1}])
+    recommender = ml_engine.UnifiedRecommender("forest")
+    recommender.load_and_train()
+    assert recommender.update_id is None
@@ -0,0 +1,20 @@
+import numpy as np
+
+import generate_data
+from harness import label_mismatches
+
+
+def test_vectorized_labels_match_scalar_rules():
+    assert label_mismatches(20_000) == 0
+
+
+
+def test_table_rule_matches_scalar_rule():
+    rng = np.random.RandomState(7)
+    table = generate_data.build_rule_table()
+    for _ in range(2000):
+        t, w = rng.uniform(-35, 42), rng.uniform(0, 30)
+        c = rng.choice(generate_data.WEATHER_CODES)
+        i = rng.randint(len(table['hobbies']))
+        assert generate_data.table_hobby_rule(t, w, c, table, i) == \
+            generate_data.hobby_rule(t, w, c, table['hobbies'][i])
@@ -0,0 +1,25 @@
+import asyncio
+
+import ml_engine
+import stub_upstream
+from harness import app_client, use_engine
+
+
+def test_sqlite_tier_survives_a_restart(tmp_path, monkeypatch):
+    import App
+
+    use_engine(ml_engine.DEFAULT_ENGINE)
+    monkeypatch.setattr(App, "GEOCODE_CACHE_DB", str(tmp_path / "geocode.sqlite"))
+
+    async def run():
+        async with app_client() as (App, client):
+            first = (await client.get("/api/weather?city=lyon")).json()["location"]
+        assert App.geocode_db is None  # closed on shutdown
+        async with app_client() as (App, client):
+            second = (await client.get("/api/weather?city=lyon")).json()["location"]
+            return first, second, stub_upstream.calls["geocode"], dict(App.geocode_db.stats)
+
+    first, second, calls, stats = asyncio.run(run())
+    assert second == first
+    assert calls == 0
+    assert stats == {"hits": 1, "misses": 0}
@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+
+import ml_engine
+from harness import app_client, use_engine
+from inference import InferenceExecutor
+
+
+class FailsOnNegativeWind:
+    engine = "fake"
+    on_stage = None
+
+    def predict_batch(self, items):
+        items = list(items)
+        if any(wind < 0 for _, wind, _, _ in items):
+            raise ValueError("negative wind")
+        return [(f"clothes for {temp}", []) for temp, _, _, _ in items]
+
+
+@pytest.mark.parametrize("kind", ["inline", "thread"])
+def test_a_failing_item_does_not_fail_its_batch_neighbours(kind):
+    executor = InferenceExecutor(FailsOnNegativeWind(), kind, workers=1, batch_window=0.05)
+
+    async def run():
+        executor.start()
+        try:
+            return await asyncio.gather(executor.predict(10, 1, 0), executor.predict(20, -1, 0),
+                                        executor.predict(30, 2, 0), return_exceptions=True)
+        finally:
+            executor.shutdown()
+
+    good, bad, other = asyncio.run(run())
+    assert good == ("clothes for 10", [])
+    assert isinstance(bad, ValueError)
+    assert other == ("clothes for 30", [])
+
+
+@pytest.mark.parametrize("temperature", ["Infinity", "-Infinity", "NaN"])
+def test_recommend_rejects_non_finite_weather(temperature):
+    import App
+
+    async def run():
+        transport = httpx.ASGITransport(app=App.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            body = '{"temperature": %s, "wind_speed": 1, "weather_code": 0, "hobbies": "бег"}' % temperature
+            return await client.post("/api/recommend", content=body, headers={"Content-Type": "application/json"})
+
+    assert asyncio.run(run()).status_code == 422
+
+
+def server_timing_stages(path, kind, monkeypatch, **request):
+    import App
+
+    use_engine(ml_engine.DEFAULT_ENGINE)
+    monkeypatch.setattr(App, "TIMING_HEADER", True)
+    monkeypatch.setattr(App, "inference", InferenceExecutor(App.recommender, kind, workers=1))
+
+    async def run():
+        async with app_client() as (_, client):
+            return await client.request(url=path, **request)
+
+    resp = asyncio.run(run())
+    assert resp.status_code == 200
+    return {part.split(";")[0] for part in resp.headers["server-timing"].split(", ")}
+
+
+@pytest.mark.parametrize("kind", ["inline", "thread"])
+def test_server_timing_has_the_prediction_stages(kind, monkeypatch):
+    stages = server_timing_stages("/api/weather?city=paris&advice=true&hobbies=бег", kind, monkeypatch,
+                                  method="GET")
+    assert {"inference", "predict_clothing", "predict_hobby"} <= stages
+
+
+def test_server_timing_leaves_out_the_stages_of_a_shared_batch(monkeypatch):
+    stages = server_timing_stages("/api/recommend", "thread", monkeypatch, method="POST",
+                                  json={"temperature": 10, "wind_speed": 3, "weather_code": 0, "hobbies": "бег"})
+    assert "inference" in stages
+    assert "predict_clothing" not in stages
@@ -0,0 +1,24 @@
+from harness import metric_delta, metrics_after_requests
+
+
+def test_metrics_after_known_requests():
+    n = 20
+    App, before, after = metrics_after_requests(n)
+
+    def delta(name, **labels):
+        return metric_delta(before, after, name, **labels)
+
+    assert delta("weather_http_requests_total", endpoint="/api/weather", method="GET", status="200") == n
+    assert delta("weather_http_requests_total", endpoint="/api/weather", method="GET", status="404") == 1
+    assert delta("weather_http_requests_total", endpoint="/api/recommend", method="POST", status="200") == n
+    # 5 cities + 1 unknown
+    assert delta("weather_stage_seconds_count", stage="geocode") == 6
+    # one failed call, every attempt of it is counted
+    assert delta("weather_upstream_errors_total", api="forecast", reason="transport") == App.UPSTREAM_RETRIES + 1
+    assert delta("weather_stage_seconds_count", stage="inference") == 2 * n
+    assert delta("weather_cache_events_total", cache="geocode", event="hits") == n - 5 + 1
+    assert delta("weather_stage_seconds_bucket", stage="inference", le="+Inf") == \
+        delta("weather_stage_seconds_count", stage="inference")
+    for stage in ("predict_clothing", "predict_hobby", "serialization"):
+        assert delta("weather_stage_seconds_count", stage=stage) > 0, stage
+    assert ("weather_model_load_seconds", frozenset({("engine", App.recommender.engine)})) in after
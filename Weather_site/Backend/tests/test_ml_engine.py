@@ -0,0 +1,30 @@
+import copy
+
+import generate_data
+import ml_engine
+
+
+def without_hobby(monkeypatch, hobby):
+    config = copy.deepcopy(generate_data.HOBBY_CONFIG)
+    for data in config.values():
+        if hobby in data["hobbies"]:
+            data["hobbies"].remove(hobby)
+    monkeypatch.setattr(generate_data, "HOBBY_CONFIG", config)
+
+
+def test_unresolvable_default_hobby_gets_no_advice(monkeypatch):
+    without_hobby(monkeypatch, "walking")
+    recommender = ml_engine.UnifiedRecommender("rules")
+    recommender.ensure_ready()
+    assert recommender.resolve_hobby("qqqq") == "walking"
+
+    items = [(10, 3, 61, ["qqqq", "бег"]), (-5, 12, 0, ["бег", "qqqq"])]
+    results = recommender.predict_batch(items)
+    for (t, w, c, hobbies), (_, advices) in zip(items, results):
+        assert advices == [(h, recommender.predict_hobby(t, w, c, h)) for h in hobbies]
+        assert dict(advices)["qqqq"] is None
+        assert dict(advices)["бег"]
+
+    clothing, texts = recommender.predict_grid([10, -5], [3, 12], [61, 0], ["qqqq", "бег"])
+    assert [row[0] for row in texts] == [None, None]
+    assert [row[1] for row in texts] == [dict(advices)["бег"] for _, advices in results]
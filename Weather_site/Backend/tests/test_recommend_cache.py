@@ -0,0 +1,12 @@
+import pytest
+
+from harness import compare_cached
+
+
+@pytest.mark.parametrize("engine", ["forest", "flat", "rules"])
+def test_cached_answers_match_uncached(engine):
+    result = compare_cached(engine, requests=300, probes=20, warm=["бег"])
+    assert result["stats"]["hits"] > 0
+    assert result["warm_hits"] > 0
+    assert result["mismatches"] == 0
+    assert result["probe_mismatches"] == 0
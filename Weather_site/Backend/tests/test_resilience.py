@@ -0,0 +1,250 @@
+import asyncio
+
+import httpx
+import pytest
+
+import ml_engine
+import stub_upstream
+from harness import UNREACHABLE, StubTransport, app_client, use_engine
+from resilience import CircuitBreaker, Deadline, LatencyTracker, backoff, hedged
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class UpperBound:
+    """rng whose uniform() always returns the upper end of the range."""
+
+    @staticmethod
+    def uniform(low, high):
+        return high
+
+
+def test_deadline_counts_down_and_stops_at_zero():
+    clock = FakeClock()
+    deadline = Deadline(2.0, clock)
+    clock.now += 0.5
+    assert deadline.remaining() == pytest.approx(1.5)
+    clock.now += 5
+    assert deadline.remaining() == 0.0
+
+
+def test_backoff_is_capped_exponential_jitter():
+    assert [backoff(a, 0.1, 1.0, UpperBound) for a in range(5)] == pytest.approx([0.1, 0.2, 0.4, 0.8, 1.0])
+    assert all(0 <= backoff(3, 0.1, 1.0) <= 0.8 for _ in range(100))
+
+
+def test_latency_tracker_quantile_needs_samples():
+    tracker = LatencyTracker(window=100, refresh=1)
+    for ms in range(1, 20):
+        tracker.add(ms / 1000)
+    assert tracker.quantile(0.95) is None
+    tracker.add(0.02)
+    assert tracker.quantile(0.95) == pytest.approx(0.019)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failures=3, reset_after=30, clock=clock)
+    breaker.failure()
+    breaker.failure()
+    breaker.success()  # not consecutive any more
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.failure()
+    assert breaker.state == "open"
+    assert breaker.rejecting()
+    assert not breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    assert breaker.stats == {"opened": 1, "rejected": 2, "probes": 0}
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failures=1, reset_after=30, clock=clock)
+    breaker.failure()
+    clock.now += 30
+    assert not breaker.rejecting()
+    assert breaker.allow()
+    assert breaker.state == "half-open"
+    assert not breaker.allow()  # only one probe at a time
+    assert breaker.rejecting()
+
+    breaker.failure()  # the probe failed: open again, for a full reset_after
+    assert breaker.state == "open"
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.stats["probes"] == 2 and breaker.stats["opened"] == 2
+
+
+def test_breaker_abandoned_probe_frees_the_next_one():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failures=1, reset_after=30, clock=clock)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.abandon()  # e.g. the client disconnected during the probe
+    assert breaker.state == "open"
+    assert breaker.allow()
+    assert breaker.stats["probes"] == 2
+
+
+def calls_with_delays(*delays):
+    """call() for hedged(): the n-th call sleeps delays[n] and returns n; records cancellations."""
+    started, cancelled = [], []
+
+    async def call():
+        n = len(started)
+        started.append(n)
+        try:
+            await asyncio.sleep(delays[n])
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return n
+
+    return call, started, cancelled
+
+
+def test_hedged_returns_the_faster_call_and_cancels_the_slower():
+    call, started, cancelled = calls_with_delays(1.0, 0.0)
+    stats = {"hedges": 0, "hedge_wins": 0}
+    assert asyncio.run(hedged(call, 0.01, stats)) == 1
+    assert started == [0, 1]
+    assert cancelled == [0]
+    assert stats == {"hedges": 1, "hedge_wins": 1}
+
+
+def test_hedged_does_not_hedge_a_fast_call_or_without_delay():
+    call, started, _ = calls_with_delays(0.0, 0.0)
+    assert asyncio.run(hedged(call, 0.5)) == 0
+    assert started == [0]
+    call, started, _ = calls_with_delays(0.05)
+    assert asyncio.run(hedged(call, None)) == 0
+    assert started == [0]
+
+
+def test_hedged_waits_for_a_success_after_one_call_fails():
+    async def run():
+        outcomes = iter([0.05, "fail"])
+
+        async def call():
+            outcome = next(outcomes)
+            if outcome == "fail":
+                raise ValueError("hedge failed")
+            await asyncio.sleep(outcome)
+            return "first"
+
+        return await hedged(call, 0.01)
+
+    assert asyncio.run(run()) == "first"
+
+
+def test_hedged_raises_when_every_call_fails():
+    async def call():
+        raise ValueError("down")
+
+    with pytest.raises(ValueError):
+        asyncio.run(hedged(call, 0.01))
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    import App
+
+    use_engine(ml_engine.DEFAULT_ENGINE)
+    monkeypatch.setattr(App, "UPSTREAM_BACKOFF", 0.001)
+    monkeypatch.setattr(App, "UPSTREAM_BACKOFF_CAP", 0.002)
+
+
+class EveryOtherFails(StubTransport):
+    """Answers every second upstream request with 503 instead of passing it to the stub."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    async def handle_async_request(self, request):
+        self.requests += 1
+        if self.requests % 2 == 0:
+            return httpx.Response(503, request=request)
+        return await super().handle_async_request(request)
+
+
+def test_failed_upstream_call_is_retried_then_answered_503(fast_retries):
+    async def run():
+        async with app_client() as (App, client):
+            stub_upstream.faults["down"] = True
+            resp = await client.get("/api/weather?city=paris")
+            return App, resp, stub_upstream.calls["geocode"]
+
+    App, resp, calls = asyncio.run(run())
+    assert resp.status_code == 503
+    assert resp.json()["detail"] == "Geocoding API unavailable"
+    assert calls == App.UPSTREAM_RETRIES + 1
+    assert App.upstream_breakers["geocode"].consecutive == 1
+
+
+def test_transient_errors_are_retried(fast_retries):
+    async def run():
+        async with app_client() as (App, client):
+            App.http_client = httpx.AsyncClient(transport=EveryOtherFails())
+            retries = {api: stats["retries"] for api, stats in App.upstream_stats.items()}
+            statuses = [(await client.get(f"/api/weather?city=retry{i}")).status_code for i in range(10)]
+            return statuses, {api: stats["retries"] - retries[api] for api, stats in App.upstream_stats.items()}
+
+    statuses, retries = asyncio.run(run())
+    assert statuses == [200] * 10
+    # the first geocode attempt passes, then every call meets one 503 first
+    assert retries == {"geocode": 9, "forecast": 10}
+
+
+def test_open_circuit_rejects_without_calling_upstream(fast_retries):
+    async def run():
+        async with app_client() as (App, client):
+            stub_upstream.faults["down"] = True
+            for i in range(App.BREAKER_FAILURES):
+                assert (await client.get(f"/api/weather?city=down{i}")).status_code == 503
+            state = App.upstream_breakers["geocode"].state
+            calls = stub_upstream.calls["geocode"]
+            resp = await client.get("/api/weather?city=one-more")
+            return App, state, calls, resp, stub_upstream.calls["geocode"]
+
+    App, state, calls_before, resp, calls_after = asyncio.run(run())
+    assert state == "open"
+    assert calls_before == App.BREAKER_FAILURES * (App.UPSTREAM_RETRIES + 1)
+    assert resp.status_code == 503
+    assert calls_after == calls_before
+
+
+def test_outage_serves_old_forecasts_offline_and_503_otherwise(fast_retries, monkeypatch):
+    async def run():
+        async with app_client() as (App, client):
+            assert (await client.get("/api/weather?city=cached")).status_code == 200
+            await App.geocode_city("uncached")  # located, but no forecast yet
+            # the cached forecast is now past its stale window: only the offline fallback may serve it
+            monkeypatch.setattr(App, "FORECAST_STALE_TTL", -2 * App.FORECAST_UPDATE_INTERVAL)
+            offline_before = App.forecast_stats["offline_served"]
+            monkeypatch.setattr(App, "OPEN_METEO_FORECAST_URL", f"http://{UNREACHABLE}/v1/forecast")
+            cached = await client.get("/api/weather?city=cached")
+            uncached = await client.get("/api/weather?city=uncached")
+            return cached, uncached, App.forecast_stats["offline_served"] - offline_before
+
+    cached, uncached, offline_served = asyncio.run(run())
+    assert cached.status_code == 200
+    assert cached.json()["current"]
+    assert offline_served == 1
+    assert uncached.status_code == 503
+    assert uncached.json()["detail"] == "Weather API unavailable"